@@ -0,0 +1,105 @@
+import time
+import threading
+
+import click
+from flask_login import UserMixin
+
+from app import app, db
+from models import Admin
+from invalidation_bus import bus
+
+
+class AdminIdentity(UserMixin):
+    """Detached, read-only view of an Admin used as current_user"""
+
+    def __init__(self, id, username, session_version):
+        self.id = id
+        self.username = username
+        self.session_version = session_version
+
+    @classmethod
+    def from_admin(cls, admin):
+        return cls(admin.id, admin.username, admin.session_version)
+
+    def get_id(self):
+        return f'{self.id}:{self.session_version}'
+
+
+class AdminIdentityCache:
+    """Per-process TTL cache of admin identities keyed by admin id"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, admin_id):
+        with self._lock:
+            entry = self._entries.get(admin_id)
+            if entry is None:
+                return None
+            identity, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[admin_id]
+                return None
+            return identity
+
+    def put(self, identity):
+        ttl = app.config['ADMIN_IDENTITY_TTL']
+        with self._lock:
+            self._entries[identity.id] = (identity, time.monotonic() + ttl)
+
+    def invalidate(self, admin_id):
+        with self._lock:
+            self._entries.pop(admin_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+identity_cache = AdminIdentityCache()
+
+
+def load_admin_identity(user_id):
+    """Resolve a session user id of the form '<id>:<session version>'"""
+    admin_id, _, version = user_id.partition(':')
+    if not admin_id.isdigit() or not version.isdigit():
+        return None
+
+    identity = identity_cache.get(int(admin_id))
+    if identity is None:
+        admin = db.session.get(Admin, int(admin_id))
+        if admin is None:
+            return None
+        identity = AdminIdentity.from_admin(admin)
+        identity_cache.put(identity)
+
+    # A bumped session version revokes every session issued before it
+    if identity.session_version != int(version):
+        return None
+    return identity
+
+
+def _invalidate_admin(admin_id):
+    if admin_id is None:
+        identity_cache.clear()
+    else:
+        identity_cache.invalidate(admin_id)
+
+
+# Committed admin changes in any worker (password, session version) drop the cached identity
+bus.subscribe('admin', _invalidate_admin)
+
+
+@app.cli.command('set-admin-password')
+@click.argument('username')
+@click.password_option()
+def set_admin_password(username, password):
+    """Change an admin's password and sign out all of their sessions."""
+    admin = Admin.query.filter_by(username=username).first()
+    if admin is None:
+        raise click.ClickException(f'No admin named {username}')
+    admin.set_password(password)
+    db.session.commit()
+    identity_cache.invalidate(admin.id)
+    click.echo(f'Password updated for {username}; existing sessions were signed out.')
@@ -0,0 +1,236 @@
+"""Recruitment analytics served from daily rollup tables.
+
+``flask refresh-analytics`` (run it from cron every few minutes) keeps two
+rollups current:
+
+* analytics_daily_registrations: registrations per day, role (crew rank or
+  staff department) and nationality, counting archived rows too.
+* analytics_daily_approvals: first approvals per day and role, with the
+  summed time from registration. Approval times come from the status history
+  in change_events, so approvals made before that feed existed are absent.
+
+Each refresh rebuilds only the days touched since the last watermark. These
+are the registration days of rows updated or deleted since then, and the
+days of new approval events. A small overlap covers transactions that
+committed out of order. The admin analytics page reads nothing but the
+rollups.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert
+from sqlalchemy.orm import aliased
+
+from app import app, db
+from models import (AnalyticsWatermark, ArchivedCrewMember, ArchivedStaffMember, ChangeEvent, CrewMember,
+                    DailyApprovals, DailyRegistrations, DeletedRecord, StaffMember)
+
+
+WATERMARK = 'rollups'
+APPROVED = 'Approved'  # Status name recorded in change_events
+DAYS_PER_BATCH = 31
+
+# entity -> (live and archived models, role attribute, nationality attribute or None)
+SOURCES = {
+    'crew': ((CrewMember, ArchivedCrewMember), 'rank', 'nationality'),
+    'staff': ((StaffMember, ArchivedStaffMember), 'department', None),
+}
+
+
+def _as_date(value):
+    """func.date() returns text on SQLite and a date on PostgreSQL"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _bounds(days):
+    return datetime.combine(days[0], time.min), datetime.combine(days[-1] + timedelta(days=1), time.min)
+
+
+def _batches(days):
+    """Sorted days in runs spanning at most DAYS_PER_BATCH days"""
+    batch = []
+    for day in sorted(days):
+        if batch and (day - batch[0]).days >= DAYS_PER_BATCH:
+            yield batch
+            batch = []
+        batch.append(day)
+    if batch:
+        yield batch
+
+
+def registration_days(entity, since=None):
+    """Registration days whose rollup rows may be stale"""
+    if since is None:
+        return {_as_date(day) for model in SOURCES[entity][0]
+                for day, in db.session.query(func.date(model.created_at)).distinct()
+                .filter(model.created_at.isnot(None))}
+
+    model = SOURCES[entity][0][0]
+    days = {_as_date(day) for day, in db.session.query(func.date(model.created_at)).distinct()
+            .filter(model.created_at.isnot(None), model.updated_at >= since)}
+    # Deleted (or archived) rows are gone; their 'created' event still knows the day
+    deleted = (db.session.query(DeletedRecord.entity_id)
+               .filter(DeletedRecord.entity == entity, DeletedRecord.deleted_at >= since))
+    created = (db.session.query(func.date(ChangeEvent.created_at)).distinct()
+               .filter(ChangeEvent.kind == 'created', ChangeEvent.entity == entity,
+                       ChangeEvent.entity_id.in_(deleted.scalar_subquery())))
+    days.update(_as_date(day) for day, in created)
+    return days
+
+
+def approval_days(entity, since=None):
+    """Days with approval events at or after since"""
+    query = (db.session.query(func.date(ChangeEvent.created_at)).distinct()
+             .filter(ChangeEvent.kind == 'status', ChangeEvent.entity == entity, ChangeEvent.detail == APPROVED))
+    if since is not None:
+        query = query.filter(ChangeEvent.created_at >= since)
+    return {_as_date(day) for day, in query}
+
+
+def _rebuild_registrations(entity, days):
+    models, role, nationality = SOURCES[entity]
+    start, end = _bounds(days)
+    wanted = set(days)
+    counts = defaultdict(int)
+    # Archived rows still count as registrations on their day
+    for model in models:
+        day = func.date(model.created_at)
+        columns = [day, getattr(model, role)] + ([getattr(model, nationality)] if nationality else [])
+        rows = (db.session.query(*columns, func.count())
+                .filter(model.created_at >= start, model.created_at < end)
+                .group_by(*columns))
+        for row in rows:
+            row_day = _as_date(row[0])
+            if row_day in wanted:
+                counts[(row_day, row[1] or '', (row[2] or '') if nationality else '')] += row[-1]
+    values = [{'day': day, 'entity': entity, 'role': role_name, 'nationality': nationality_name,
+               'registrations': count} for (day, role_name, nationality_name), count in counts.items()]
+
+    table = DailyRegistrations.__table__
+    db.session.execute(delete(table).where(table.c.entity == entity, table.c.day.in_(days)))
+    if values:
+        db.session.execute(insert(table), values)
+
+
+def _rebuild_approvals(entity, days):
+    models, role, _ = SOURCES[entity]
+    start, end = _bounds(days)
+    earlier = aliased(ChangeEvent)
+    first_approval = ~exists().where(
+        earlier.entity == ChangeEvent.entity, earlier.entity_id == ChangeEvent.entity_id,
+        earlier.kind == 'status', earlier.detail == APPROVED, earlier.id < ChangeEvent.id)
+
+    def approvals(model):
+        return (db.session.query(ChangeEvent.created_at, model.created_at, getattr(model, role))
+                .join(model, model.id == ChangeEvent.entity_id)
+                .filter(ChangeEvent.kind == 'status', ChangeEvent.entity == entity,
+                        ChangeEvent.detail == APPROVED, ChangeEvent.created_at >= start,
+                        ChangeEvent.created_at < end, first_approval))
+
+    wanted = set(days)
+    totals = defaultdict(lambda: [0, 0.0])
+    for approved_at, registered_at, role_name in (row for model in models for row in approvals(model)):
+        if approved_at.date() not in wanted:
+            continue
+        total = totals[(approved_at.date(), role_name or '')]
+        total[0] += 1
+        if registered_at is not None:
+            total[1] += max((approved_at - registered_at).total_seconds(), 0)
+
+    table = DailyApprovals.__table__
+    db.session.execute(delete(table).where(table.c.entity == entity, table.c.day.in_(days)))
+    if totals:
+        db.session.execute(insert(table), [
+            {'day': day, 'entity': entity, 'role': role_name, 'approvals': count, 'approval_seconds': seconds}
+            for (day, role_name), (count, seconds) in totals.items()])
+
+
+def refresh_rollups(full=False):
+    """Rebuild the stale rollup days (all days with full); returns the number rebuilt"""
+    started = datetime.utcnow()
+    watermark = db.session.get(AnalyticsWatermark, WATERMARK)
+    since = None
+    if watermark is not None and not full:
+        since = watermark.value - timedelta(seconds=current_app.config['ANALYTICS_REFRESH_OVERLAP'])
+
+    rebuilt = 0
+    for entity in SOURCES:
+        if since is None:
+            for table in (DailyRegistrations.__table__, DailyApprovals.__table__):
+                db.session.execute(delete(table).where(table.c.entity == entity))
+        for batch in _batches(registration_days(entity, since)):
+            _rebuild_registrations(entity, batch)
+            db.session.commit()
+            rebuilt += len(batch)
+        for batch in _batches(approval_days(entity, since)):
+            _rebuild_approvals(entity, batch)
+            db.session.commit()
+            rebuilt += len(batch)
+
+    watermark = db.session.get(AnalyticsWatermark, WATERMARK)
+    if watermark is None:
+        watermark = AnalyticsWatermark(name=WATERMARK)
+        db.session.add(watermark)
+    watermark.value = started
+    watermark.refreshed_at = datetime.utcnow()
+    db.session.commit()
+    return rebuilt
+
+
+def _bucket(day, monthly):
+    return day.replace(day=1) if monthly else day
+
+
+def analytics_report(entity, start, end):
+    """Figures for the analytics page, read from the rollups only"""
+    registrations = DailyRegistrations.query.filter(
+        DailyRegistrations.entity == entity, DailyRegistrations.day >= start, DailyRegistrations.day <= end)
+    approvals = DailyApprovals.query.filter(
+        DailyApprovals.entity == entity, DailyApprovals.day >= start, DailyApprovals.day <= end)
+    total = func.sum(DailyRegistrations.registrations)
+
+    # Long ranges are shown per month so the table stays readable
+    monthly = (end - start).days > 92
+    timeline = defaultdict(int)
+    for day, count in (registrations.with_entities(DailyRegistrations.day, total)
+                       .group_by(DailyRegistrations.day)):
+        timeline[_bucket(day, monthly)] += count
+
+    by_role = (registrations.with_entities(DailyRegistrations.role, total)
+               .group_by(DailyRegistrations.role).order_by(total.desc()).all())
+    by_nationality = (registrations.with_entities(DailyRegistrations.nationality, total)
+                      .group_by(DailyRegistrations.nationality).order_by(total.desc()).all()
+                      if SOURCES[entity][2] else [])
+
+    approval_rows = (approvals.with_entities(DailyApprovals.role, func.sum(DailyApprovals.approvals),
+                                             func.sum(DailyApprovals.approval_seconds))
+                     .group_by(DailyApprovals.role).all())
+    approval_by_role = sorted(
+        ({'role': role_name, 'approvals': count, 'average_days': seconds / count / 86400}
+         for role_name, count, seconds in approval_rows if count),
+        key=lambda item: -item['approvals'])
+    approved = sum(item['approvals'] for item in approval_by_role)
+    approval_seconds = sum(seconds or 0 for _, _, seconds in approval_rows)
+
+    watermark = db.session.get(AnalyticsWatermark, WATERMARK)
+    return {
+        'timeline': sorted(timeline.items()),
+        'monthly': monthly,
+        'total_registrations': sum(timeline.values()),
+        'by_role': by_role,
+        'by_nationality': by_nationality,
+        'approval_by_role': approval_by_role,
+        'total_approvals': approved,
+        'average_days_to_approval': approval_seconds / approved / 86400 if approved else None,
+        'refreshed_at': watermark.refreshed_at if watermark else None,
+    }
+
+
+@app.cli.command('refresh-analytics')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of only the stale ones.')
+def refresh_analytics(full):
+    """Bring the analytics rollup tables up to date."""
+    rebuilt = refresh_rollups(full=full)
+    click.echo(f'Rebuilt {rebuilt} rollup day(s)')
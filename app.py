@@ -1,5 +1,4 @@
 import os
-import logging
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
@@ -7,21 +6,28 @@ from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 
+from db_routing import RoutingSession, REPLICA_BIND_KEY
+from logging_setup import configure_logging, parse_levels
+
 
 class Base(DeclarativeBase):
     pass
 
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)  # remote_addr is the client, for login throttling
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO')
+app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+app.config['LOG_LEVELS'] = parse_levels(os.environ.get('LOG_LEVELS', 'sqlalchemy.engine=WARNING,werkzeug=INFO'))
+app.config['LOG_DEBUG_SAMPLE_RATE'] = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 0.01))
+configure_logging(app)
 
 # configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///maricheck.db")
@@ -30,10 +36,119 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
+# Optional read replica for read-only admin and tracking views
+if os.environ.get("DATABASE_REPLICA_URL"):
+    app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND_KEY: os.environ["DATABASE_REPLICA_URL"]}
+app.config["REPLICA_READ_YOUR_WRITES_SECONDS"] = int(os.environ.get("REPLICA_READ_YOUR_WRITES_SECONDS", 10))
+
+# Admin list pagination
+app.config['ADMIN_LIST_PAGE_SIZE'] = int(os.environ.get('ADMIN_LIST_PAGE_SIZE', 50))
+
+# Rendered admin list rows ('memory' per worker, or 'redis' shared by all workers)
+app.config['FRAGMENT_CACHE_ENABLED'] = os.environ.get('FRAGMENT_CACHE_ENABLED', '1') == '1'
+app.config['FRAGMENT_CACHE_SIZE'] = int(os.environ.get('FRAGMENT_CACHE_SIZE', 5000))  # Rows kept per worker
+app.config['FRAGMENT_CACHE_BACKEND'] = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+app.config['FRAGMENT_CACHE_REDIS_URL'] = os.environ.get('FRAGMENT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['FRAGMENT_CACHE_TTL'] = int(os.environ.get('FRAGMENT_CACHE_TTL', 24 * 3600))  # Seconds in Redis
+
+# Admin identity cache used by the login user loader
+app.config['ADMIN_IDENTITY_TTL'] = int(os.environ.get('ADMIN_IDENTITY_TTL', 3600))
+
+# Cross-worker cache invalidation ('auto', 'postgres', 'socket' or 'local')
+app.config['INVALIDATION_BUS'] = os.environ.get('INVALIDATION_BUS', 'auto')
+app.config['INVALIDATION_SOCKET_DIR'] = os.environ.get('INVALIDATION_SOCKET_DIR', os.path.join(app.instance_path, 'invalidation_bus'))
+
+# Admin login throttling ('memory' per worker or 'database' shared by all workers)
+app.config['LOGIN_THROTTLE_ENABLED'] = os.environ.get('LOGIN_THROTTLE_ENABLED', '1') == '1'
+app.config['LOGIN_THROTTLE_BACKEND'] = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+app.config['LOGIN_THROTTLE_IP_CAPACITY'] = int(os.environ.get('LOGIN_THROTTLE_IP_CAPACITY', 20))
+app.config['LOGIN_THROTTLE_IP_PER_MINUTE'] = float(os.environ.get('LOGIN_THROTTLE_IP_PER_MINUTE', 10))
+app.config['LOGIN_THROTTLE_USER_CAPACITY'] = int(os.environ.get('LOGIN_THROTTLE_USER_CAPACITY', 10))
+app.config['LOGIN_THROTTLE_USER_PER_MINUTE'] = float(os.environ.get('LOGIN_THROTTLE_USER_PER_MINUTE', 2))
+app.config['LOGIN_THROTTLE_MAX_BUCKETS'] = int(os.environ.get('LOGIN_THROTTLE_MAX_BUCKETS', 100000))
+app.config['LOGIN_THROTTLE_SWEEP_SECONDS'] = float(os.environ.get('LOGIN_THROTTLE_SWEEP_SECONDS', 300))
+
+# Configure instrumentation
+app.config['SERVER_TIMING_ENABLED'] = os.environ.get('SERVER_TIMING_ENABLED', '1') == '1'
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# Bearer token for unattended delta export downloads
+app.config['EXPORT_TOKEN'] = os.environ.get('EXPORT_TOKEN')
+# Rows updated this long before a delta export's watermark are sent again, for late commits
+app.config['DELTA_EXPORT_OVERLAP_SECONDS'] = int(os.environ.get('DELTA_EXPORT_OVERLAP_SECONDS', 900))
+
+# Configure the admin change feed and its Server-Sent Events stream
+app.config['CHANGE_FEED_PAGE_SIZE'] = int(os.environ.get('CHANGE_FEED_PAGE_SIZE', '100'))
+# poll: admin pages fetch /admin/api/changes; stream: Server-Sent Events, for the ASGI deployment only
+app.config['CHANGE_FEED_TRANSPORT'] = os.environ.get('CHANGE_FEED_TRANSPORT', 'poll')
+app.config['CHANGE_FEED_POLL_SECONDS'] = float(os.environ.get('CHANGE_FEED_POLL_SECONDS', '15'))
+app.config['CHANGE_FEED_OVERLAP_SECONDS'] = float(os.environ.get('CHANGE_FEED_OVERLAP_SECONDS', '30'))
+app.config['CHANGE_STREAM_POLL_SECONDS'] = float(os.environ.get('CHANGE_STREAM_POLL_SECONDS', '2'))
+app.config['CHANGE_STREAM_HEARTBEAT_SECONDS'] = float(os.environ.get('CHANGE_STREAM_HEARTBEAT_SECONDS', '15'))
+app.config['CHANGE_STREAM_MAX_SECONDS'] = float(os.environ.get('CHANGE_STREAM_MAX_SECONDS', '300'))
+
+# Configure on-demand request profiling
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_MAX_FILES'] = int(os.environ.get('PROFILE_MAX_FILES', 200))
+app.config['PROFILE_MAX_BYTES'] = int(os.environ.get('PROFILE_MAX_BYTES', 100 * 1024 * 1024))
+
 # Configure file uploads
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Document storage: 'local' (UPLOAD_FOLDER) or 's3' (any S3-compatible endpoint, needs boto3)
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET')
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX', '')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL')  # e.g. a MinIO server
+app.config['S3_REGION'] = os.environ.get('S3_REGION')
+app.config['S3_PRESIGN_TTL'] = int(os.environ.get('S3_PRESIGN_TTL', 900))  # Seconds a presigned URL stays valid
+
+# Archival of rejected and inactive applications (flask archive-records)
+app.config['ARCHIVE_REJECTED_MONTHS'] = int(os.environ.get('ARCHIVE_REJECTED_MONTHS', 6))  # Since the rejection (last update)
+app.config['ARCHIVE_INACTIVE_MONTHS'] = int(os.environ.get('ARCHIVE_INACTIVE_MONTHS', 24))  # Since the last update
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 200))
+app.config['ARCHIVE_BATCH_PAUSE'] = float(os.environ.get('ARCHIVE_BATCH_PAUSE', 1.0))  # Seconds between batches
+app.config['ARCHIVE_STORAGE_BACKEND'] = os.environ.get('ARCHIVE_STORAGE_BACKEND', '')  # Defaults to STORAGE_BACKEND
+app.config['ARCHIVE_UPLOAD_FOLDER'] = os.environ.get('ARCHIVE_UPLOAD_FOLDER', os.path.join(app.instance_path, 'archive_uploads'))
+app.config['ARCHIVE_S3_BUCKET'] = os.environ.get('ARCHIVE_S3_BUCKET', '')  # Defaults to S3_BUCKET
+app.config['ARCHIVE_S3_PREFIX'] = os.environ.get('ARCHIVE_S3_PREFIX', 'archive')
+app.config['ARCHIVE_S3_STORAGE_CLASS'] = os.environ.get('ARCHIVE_S3_STORAGE_CLASS', 'GLACIER_IR')
+
+# Configure resumable (chunked) document uploads
+app.config['UPLOAD_STAGING_FOLDER'] = os.environ.get('UPLOAD_STAGING_FOLDER', os.path.join(app.instance_path, 'upload_staging'))
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # Suggested to clients
+app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # Seconds since last chunk
+app.config['UPLOAD_SAVE_WORKERS'] = int(os.environ.get('UPLOAD_SAVE_WORKERS', 4))  # Documents written at once per form
+
+# Orphaned upload garbage collection (flask gc-uploads)
+app.config['UPLOAD_GC_GRACE_HOURS'] = float(os.environ.get('UPLOAD_GC_GRACE_HOURS', 24))
+app.config['UPLOAD_QUARANTINE_FOLDER'] = os.environ.get('UPLOAD_QUARANTINE_FOLDER', os.path.join(app.instance_path, 'upload_quarantine'))
+
+# Response compression (brotli is used when the package is installed)
+app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_BR_QUALITY'] = int(os.environ.get('COMPRESS_BR_QUALITY', 5))
+app.config['COMPRESS_STREAM_LEVEL'] = int(os.environ.get('COMPRESS_STREAM_LEVEL', 5))
+
+# Normalize uploaded images (requires Pillow)
+app.config['IMAGE_NORMALIZE_ENABLED'] = os.environ.get('IMAGE_NORMALIZE_ENABLED', '1') == '1'
+app.config['IMAGE_MAX_DIMENSION'] = int(os.environ.get('IMAGE_MAX_DIMENSION', 2000))
+app.config['IMAGE_JPEG_QUALITY'] = int(os.environ.get('IMAGE_JPEG_QUALITY', 82))
+app.config['IMAGE_KEEP_ORIGINAL'] = os.environ.get('IMAGE_KEEP_ORIGINAL', '0') == '1'
+app.config['IMAGE_NORMALIZE_WORKERS'] = int(os.environ.get('IMAGE_NORMALIZE_WORKERS', 2))
+
+# Analytics rollups (flask refresh-analytics): re-scan this many seconds before the last watermark
+app.config['ANALYTICS_REFRESH_OVERLAP'] = int(os.environ.get('ANALYTICS_REFRESH_OVERLAP', 600))
+
+# ASGI serving mode (uvicorn asgi:application): threads running the Flask side
+app.config['ASGI_WSGI_THREADS'] = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+# Calling code assumed for phone numbers entered without one
+app.config['PHONE_DEFAULT_COUNTRY_CODE'] = os.environ.get('PHONE_DEFAULT_COUNTRY_CODE', '91')
+
 # Initialize extensions
 db.init_app(app)
 login_manager.init_app(app)
@@ -44,9 +159,20 @@ with app.app_context():
     # Import models and routes
     import models
     import routes
+    import metrics
+    import invalidation_bus
+    import fragment_cache
+    import profiling
+    import admin_identity
+    import compression
+    import static_assets
+    import upload_gc
+    import upload_layout
+    import migrations
     
     # Create tables
     db.create_all()
+    migrations.run_migrations()
     
     # Create default admin if not exists
     from werkzeug.security import generate_password_hash
@@ -62,4 +188,4 @@ with app.app_context():
 
 @login_manager.user_loader
 def load_user(user_id):
-    return models.Admin.query.get(int(user_id))
+    return admin_identity.load_admin_identity(user_id)
@@ -1,6 +1,7 @@
 from app import db
 from datetime import datetime
 from flask_login import UserMixin
+from werkzeug.security import generate_password_hash
 import secrets
 import hashlib
 
@@ -12,15 +13,29 @@ class Admin(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    session_version = db.Column(db.Integer, nullable=False, default=1)  # Bumped to revoke all sessions
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Admin {self.username}>'
+    
+    def get_id(self):
+        """Session identifier including the session version"""
+        return f'{self.id}:{self.session_version or 1}'
+    
+    def set_password(self, password):
+        """Set a new password and revoke existing sessions"""
+        self.password_hash = generate_password_hash(password)
+        self.session_version = (self.session_version or 1) + 1
 
 
 class CrewMember(db.Model):
     """Crew member model for registration and tracking"""
     __tablename__ = 'crew_members'
+    __table_args__ = (
+        db.Index('ix_crew_members_updated_at_id', 'updated_at', 'id'),  # Delta export watermark
+        db.Index('ix_crew_members_created_at', 'created_at'),  # List order, analytics day rollups
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
@@ -37,6 +52,10 @@ class CrewMember(db.Model):
     mobile_number = db.Column(db.String(20), nullable=False)
     email = db.Column(db.String(120), nullable=False)
     
+    # Normalized copies of the contact fields for indexed lookups
+    email_normalized = db.Column(db.String(120), index=True)
+    mobile_e164 = db.Column(db.String(16), index=True)
+    
     # Emergency contact
     emergency_contact_name = db.Column(db.String(128))
     emergency_contact_phone = db.Column(db.String(20))
@@ -102,14 +121,20 @@ class CrewMember(db.Model):
     
     def generate_profile_token(self):
         """Generate a secure token for profile access"""
-        if not self.profile_token:
-            # Generate a secure random token
-            random_bytes = secrets.token_bytes(32)
-            # Create a hash that includes crew ID for uniqueness
-            token_data = f"{self.id}_{self.passport}_{random_bytes.hex()}"
-            self.profile_token = hashlib.sha256(token_data.encode()).hexdigest()
+        if self.assign_profile_token():
             db.session.commit()
         return self.profile_token
+
+    def assign_profile_token(self):
+        """Set profile_token unless there is one; needs the id, so flush first"""
+        if self.profile_token:
+            return False
+        # Generate a secure random token
+        random_bytes = secrets.token_bytes(32)
+        # Create a hash that includes crew ID for uniqueness
+        token_data = f"{self.id}_{self.passport}_{random_bytes.hex()}"
+        self.profile_token = hashlib.sha256(token_data.encode()).hexdigest()
+        return True
     
     def get_required_documents(self):
         """Get list of required documents with their status"""
@@ -163,6 +188,10 @@ class CrewMember(db.Model):
 class StaffMember(db.Model):
     """Staff member model for offshore/office staff registration"""
     __tablename__ = 'staff_members'
+    __table_args__ = (
+        db.Index('ix_staff_members_updated_at_id', 'updated_at', 'id'),  # Delta export watermark
+        db.Index('ix_staff_members_created_at', 'created_at'),  # List order, analytics day rollups
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(128), nullable=False)
@@ -175,6 +204,11 @@ class StaffMember(db.Model):
     availability_date = db.Column(db.Date, nullable=False)
     mobile_number = db.Column(db.String(20), nullable=False)
     
+    # Normalized copies of the contact fields for indexed lookups
+    email_normalized = db.Column(db.String(128), index=True)  # When email_or_whatsapp is an email
+    whatsapp_e164 = db.Column(db.String(16), index=True)  # When email_or_whatsapp is a number
+    mobile_e164 = db.Column(db.String(16), index=True)
+    
     # Additional information
     education = db.Column(db.String(255))
     certifications = db.Column(db.Text)
@@ -212,3 +246,136 @@ class StaffMember(db.Model):
             -1: "danger"
         }
         return status_classes.get(self.status, "warning")
+
+
+def _archive_table(source, name):
+    """Columns of source without its indexes or unique constraints, plus archive metadata"""
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key,
+                         autoincrement=False, nullable=column.nullable)
+               for column in source.columns]
+    return db.Table(
+        name, db.metadata, *columns,
+        db.Column('archived_at', db.DateTime, nullable=False, default=datetime.utcnow),
+        db.Column('archive_reason', db.String(16), nullable=False),  # 'rejected' or 'inactive'
+        db.Index(f'ix_{name}_created_at', 'created_at'),
+    )
+
+
+class ArchivedCrewMember(db.Model):
+    """Crew member moved out of crew_members by archival.py, keeping its id"""
+    __table__ = _archive_table(CrewMember.__table__, 'crew_members_archive')
+
+    get_status_name = CrewMember.get_status_name
+    get_status_class = CrewMember.get_status_class
+    get_required_documents = CrewMember.get_required_documents
+    get_profile_completion_percentage = CrewMember.get_profile_completion_percentage
+
+
+class ArchivedStaffMember(db.Model):
+    """Staff member moved out of staff_members by archival.py, keeping its id"""
+    __table__ = _archive_table(StaffMember.__table__, 'staff_members_archive')
+
+    get_status_name = StaffMember.get_status_name
+    get_status_class = StaffMember.get_status_class
+
+
+class LoginThrottleBucket(db.Model):
+    """Shared token bucket state for admin login throttling across workers"""
+    __tablename__ = 'login_throttle_buckets'
+    __table_args__ = (
+        db.Index('ix_login_throttle_buckets_updated_at', 'updated_at'),  # Sweeping refilled buckets
+    )
+    
+    key = db.Column(db.String(160), primary_key=True)  # 'ip:<address>' or 'user:<username>'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix timestamp of the last refill
+
+
+class DeletedRecord(db.Model):
+    """Tombstone for a deleted crew or staff row, consumed by delta exports"""
+    __tablename__ = 'deleted_records'
+    __table_args__ = (
+        db.Index('ix_deleted_records_entity_deleted_at', 'entity', 'deleted_at', 'entity_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(32), nullable=False)  # 'crew' or 'staff'
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ChangeEvent(db.Model):
+    """Append-only feed of registrations, status changes and uploads for live admin views"""
+    __tablename__ = 'change_events'
+    __table_args__ = (
+        db.Index('ix_change_events_kind_created_at', 'kind', 'created_at'),  # Analytics refresh
+        db.Index('ix_change_events_entity_id', 'entity', 'entity_id', 'id'),  # Status history of one row
+        db.Index('ix_change_events_created_at', 'created_at'),  # Late-commit overlap window
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)  # Feed cursor
+    entity = db.Column(db.String(32), nullable=False)  # 'crew' or 'staff'
+    entity_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(16), nullable=False)  # 'created', 'status', 'upload', 'archived' or 'restored'
+    label = db.Column(db.String(128))  # Display name at the time of the change
+    detail = db.Column(db.String(255))  # New status name, uploaded document fields or archive reason
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class DuplicateKey(db.Model):
+    """Blocking key (normalized email, mobile or phonetic name + DOB) for duplicate detection"""
+    __tablename__ = 'duplicate_keys'
+    __table_args__ = (
+        db.Index('ix_duplicate_keys_key', 'key'),
+        db.Index('ix_duplicate_keys_entity', 'entity', 'entity_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(32), nullable=False)  # 'crew' or 'staff'
+    entity_id = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.String(160), nullable=False)  # '<kind>:<normalized value>'
+
+
+class UploadSession(db.Model):
+    """In-progress resumable upload of one crew document"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # Random hex, also names the staging file
+    crew_member_id = db.Column(db.Integer, db.ForeignKey('crew_members.id', ondelete='CASCADE'), nullable=False)
+    field = db.Column(db.String(64), nullable=False)  # Target *_file column
+    filename = db.Column(db.String(255), nullable=False)
+    length = db.Column(db.BigInteger, nullable=False)  # Total size in bytes
+    offset = db.Column(db.BigInteger, nullable=False, default=0)  # Bytes received so far
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class DailyRegistrations(db.Model):
+    """Registrations per day, role and nationality, maintained by analytics.refresh_rollups()"""
+    __tablename__ = 'analytics_daily_registrations'
+    
+    day = db.Column(db.Date, primary_key=True)
+    entity = db.Column(db.String(32), primary_key=True)  # 'crew' or 'staff'
+    role = db.Column(db.String(128), primary_key=True)  # Crew rank or staff department
+    nationality = db.Column(db.String(64), primary_key=True)  # Empty for staff
+    registrations = db.Column(db.Integer, nullable=False)
+
+
+class DailyApprovals(db.Model):
+    """First approvals per day and role with the total time since registration"""
+    __tablename__ = 'analytics_daily_approvals'
+    
+    day = db.Column(db.Date, primary_key=True)  # Day of the approval
+    entity = db.Column(db.String(32), primary_key=True)
+    role = db.Column(db.String(128), primary_key=True)
+    approvals = db.Column(db.Integer, nullable=False)
+    approval_seconds = db.Column(db.Float, nullable=False)  # Sum of registered -> approved durations
+
+
+class AnalyticsWatermark(db.Model):
+    """Point up to which the analytics rollups reflect the source tables"""
+    __tablename__ = 'analytics_watermarks'
+    
+    name = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.DateTime, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
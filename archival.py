@@ -0,0 +1,248 @@
+"""Archival of closed applications out of the hot crew and staff tables.
+
+``flask archive-records`` moves two kinds of rows into crew_members_archive
+and staff_members_archive, keeping their ids:
+
+* rejected rows not updated for ARCHIVE_REJECTED_MONTHS;
+* any row not updated for ARCHIVE_INACTIVE_MONTHS.
+
+Both rules use updated_at, so the delta-export index on (updated_at, id)
+serves them, and a restored row is not archived again on the next run.
+
+The lists, counts and searches then only touch live applications. Rows move
+in batches of ARCHIVE_BATCH_SIZE with a pause between batches. Each batch
+first copies the rows' documents to cold storage (ARCHIVE_STORAGE_BACKEND).
+Then, in one transaction, it locks the rows that are still eligible, copies
+them into the archive table, writes delta-export tombstones and 'archived'
+change events, and deletes them. The hot copies of the documents are removed only after the commit.
+
+Archived rows stay searchable from the admin lists with "Include archived",
+and restore_record() moves a row and its documents back, dropping its
+tombstone and writing a 'restored' change event. Duplicate-detection
+keys and change history are kept, so a rejected applicant who registers
+again is still flagged. Columns added to the live tables later must also be
+added to the archive tables in migrations.py.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from sqlalchemy import and_, case, delete, insert, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from change_feed import FEED_MODELS
+from image_processing import IMAGE_EXTENSIONS
+from invalidation_bus import bus
+from models import (ArchivedCrewMember, ArchivedStaffMember, ChangeEvent, CrewMember, DeletedRecord, StaffMember,
+                    UploadSession)
+from resumable_uploads import staging_path
+from storage import get_archive_storage, get_storage
+from upload_gc import Throttle
+
+
+REJECTED = -1
+
+# entity -> (live model, archive model)
+ARCHIVE_MODELS = {
+    'crew': (CrewMember, ArchivedCrewMember),
+    'staff': (StaffMember, ArchivedStaffMember),
+}
+
+
+class ArchiveError(Exception):
+    """A record could not be archived or restored"""
+
+
+def _cutoffs(now):
+    config = current_app.config
+    return (now - timedelta(days=30 * config['ARCHIVE_REJECTED_MONTHS']),
+            now - timedelta(days=30 * config['ARCHIVE_INACTIVE_MONTHS']))
+
+
+def _rejected(columns, now):
+    return and_(columns.status == REJECTED, columns.updated_at < _cutoffs(now)[0])
+
+
+def eligible(columns, now):
+    """Condition matching rows that are due for archival"""
+    return or_(_rejected(columns, now), columns.updated_at < _cutoffs(now)[1])
+
+
+def _file_columns(model):
+    return [column.key for column in model.__table__.columns if column.key.endswith('_file')]
+
+
+def _document_keys(storage, row):
+    """Existing document keys of row, including kept originals"""
+    for field in _file_columns(type(row)):
+        key = getattr(row, field)
+        if not key or storage.stat(key) is None:
+            continue
+        yield key
+        folder, name = key.rsplit('/', 1)
+        stem = os.path.splitext(name)[0]
+        for ext in sorted(IMAGE_EXTENSIONS):
+            original = f'{folder}/originals/{stem}{ext}'
+            if storage.stat(original) is not None:
+                yield original
+
+
+def _transfer(source, target, key):
+    """Copy key from one storage backend to another unless it is already there"""
+    if target.stat(key) is not None:
+        return
+    body = source.open(key)
+    try:
+        target.save(key, body)
+    finally:
+        body.close()
+
+
+def _change_events(kind, model, table, detail, now, condition):
+    """INSERT ... SELECT of one change event per row of table (model's or its archive's) matching condition"""
+    entity, label_attr = FEED_MODELS[model]
+    return insert(ChangeEvent.__table__).from_select(
+        ['entity', 'entity_id', 'kind', 'label', 'detail', 'created_at'],
+        select(literal(entity), table.c.id, literal(kind), table.c[label_attr], detail, literal(now)).where(condition))
+
+
+def archive_batch(entity, ids, now, throttle):
+    """Archive the rows among ids that are still eligible; returns (rows, files)"""
+    model, archive = ARCHIVE_MODELS[entity]
+    table, archive_table = model.__table__, archive.__table__
+    hot, cold = get_storage(), get_archive_storage()
+
+    documents = {row.id: list(_document_keys(hot, row)) for row in model.query.filter(model.id.in_(ids))}
+    for keys in documents.values():
+        for key in keys:
+            throttle.wait()
+            _transfer(hot, cold, key)
+    db.session.rollback()  # No transaction held while documents were copied
+
+    locked = db.session.execute(
+        select(table.c.id).where(table.c.id.in_(ids), eligible(table.c, now)).with_for_update()).scalars().all()
+    if locked:
+        names = [column.name for column in table.columns]
+        reason = case((_rejected(table.c, now), 'rejected'), else_='inactive')
+        db.session.execute(insert(archive_table).from_select(
+            names + ['archived_at', 'archive_reason'],
+            select(*[table.c[name] for name in names], literal(now), reason).where(table.c.id.in_(locked))))
+        db.session.execute(insert(DeletedRecord.__table__), [
+            {'entity': entity, 'entity_id': row_id, 'deleted_at': now} for row_id in locked])
+        db.session.execute(_change_events('archived', model, table, reason, now, table.c.id.in_(locked)))
+        if model is CrewMember:
+            sessions = UploadSession.query.filter(UploadSession.crew_member_id.in_(locked))
+            for upload_id in [upload.id for upload in sessions]:
+                try:
+                    os.remove(staging_path(upload_id))
+                except FileNotFoundError:
+                    pass
+            sessions.delete(synchronize_session=False)
+        db.session.execute(delete(table).where(table.c.id.in_(locked)))
+    db.session.commit()
+    bus.publish([(entity, row_id) for row_id in locked])
+
+    # Drop the hot copies of archived rows, and the cold copies of rows that changed meanwhile
+    archived = set(locked)
+    for row_id, keys in documents.items():
+        storage = hot if row_id in archived else cold
+        for key in keys:
+            throttle.wait()
+            storage.delete(key)
+    return len(locked), sum(len(documents[row_id]) for row_id in archived if row_id in documents)
+
+
+def count_eligible(now=None):
+    """{entity: rows due for archival}"""
+    now = now or datetime.utcnow()
+    return {entity: model.query.filter(eligible(model, now)).count()
+            for entity, (model, _) in ARCHIVE_MODELS.items()}
+
+
+def archive_records(batch_size=200, pause=0.0, max_ops=0, limit=0, echo=None):
+    """Archive every eligible row in throttled batches; returns {entity: (rows, files)}"""
+    now = datetime.utcnow()
+    throttle = Throttle(max_ops)
+    totals = {}
+    for entity, (model, _) in ARCHIVE_MODELS.items():
+        rows = files = 0
+        last_id = 0
+        while not limit or rows < limit:
+            size = min(batch_size, limit - rows) if limit else batch_size
+            ids = [row_id for row_id, in db.session.query(model.id)
+                   .filter(model.id > last_id, eligible(model, now)).order_by(model.id).limit(size)]
+            db.session.rollback()
+            if not ids:
+                break
+            last_id = ids[-1]
+            archived, moved = archive_batch(entity, ids, now, throttle)
+            rows += archived
+            files += moved
+            if echo:
+                echo(f'{entity}: archived {rows} row(s), {files} document(s), through id {last_id}')
+            if pause:
+                time.sleep(pause)
+        totals[entity] = (rows, files)
+    return totals
+
+
+def restore_record(entity, record_id):
+    """Move an archived row and its documents back to the live tables"""
+    model, archive = ARCHIVE_MODELS[entity]
+    table, archive_table = model.__table__, archive.__table__
+    row = db.session.get(archive, record_id)
+    if row is None:
+        raise ArchiveError('This record is not archived.')
+
+    hot, cold = get_storage(), get_archive_storage()
+    keys = list(_document_keys(cold, row))
+    for key in keys:
+        _transfer(cold, hot, key)
+
+    # A fresh updated_at keeps the row from being archived again on the next run
+    now = datetime.utcnow()
+    names = [column.name for column in table.columns]
+    values = [literal(now) if name == 'updated_at' else archive_table.c[name] for name in names]
+    try:
+        db.session.execute(insert(table).from_select(names, select(*values).where(archive_table.c.id == record_id)))
+        db.session.execute(_change_events('restored', model, archive_table, literal(None), now,
+                                          archive_table.c.id == record_id))
+        # The live row is exported again by its new updated_at; its tombstone would delete it
+        db.session.execute(delete(DeletedRecord.__table__).where(
+            DeletedRecord.entity == entity, DeletedRecord.entity_id == record_id))
+        db.session.execute(delete(archive_table).where(archive_table.c.id == record_id))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        for key in keys:
+            if cold.stat(key) is not None:
+                hot.delete(key)
+        raise ArchiveError('A live record with the same passport, token or id already exists.')
+
+    bus.publish([(entity, record_id)])
+    for key in keys:
+        cold.delete(key)
+    return db.session.get(model, record_id)
+
+
+@app.cli.command('archive-records')
+@click.option('--batch-size', type=int, default=None, help='Rows per transaction (default ARCHIVE_BATCH_SIZE).')
+@click.option('--pause', type=float, default=None, help='Seconds between batches (default ARCHIVE_BATCH_PAUSE).')
+@click.option('--max-ops', type=float, default=0, help='Limit document operations per second (0 = unlimited).')
+@click.option('--limit', type=int, default=0, help='Archive at most this many rows per entity (0 = all).')
+@click.option('--dry-run', is_flag=True, help='Only count the rows that are due.')
+def archive_records_command(batch_size, pause, max_ops, limit, dry_run):
+    """Move rejected and inactive applications into the archive tables."""
+    config = current_app.config
+    if dry_run:
+        for entity, count in count_eligible().items():
+            click.echo(f'{entity}: {count} row(s) due for archival')
+        return
+    totals = archive_records(batch_size or config['ARCHIVE_BATCH_SIZE'],
+                             config['ARCHIVE_BATCH_PAUSE'] if pause is None else pause,
+                             max_ops, limit, echo=lambda line: click.echo(line, err=True))
+    for entity, (rows, files) in totals.items():
+        click.echo(f'{entity}: archived {rows} row(s) and moved {files} document(s) to cold storage')
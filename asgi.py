@@ -0,0 +1,335 @@
+"""ASGI entry point that serves the public pages on an event loop.
+
+    uvicorn asgi:application --workers 4 --proxy-headers --forwarded-allow-ips <proxy address>
+
+The home page, crew registration, status tracking and the private profile
+page mostly wait. They wait on the database, and above all on applicants
+uploading documents over slow connections. A gunicorn sync worker is held for
+the whole upload. Here those four pages run as coroutines instead. Starlette
+reads the request body without blocking, and the queries use async SQLAlchemy
+on the same database: aiosqlite for SQLite, asyncpg for PostgreSQL. Only the
+short blocking steps leave the event loop: saving documents and publishing
+cache invalidations run in worker threads.
+
+Everything else, including all of the admin side, is the unchanged Flask app.
+A WSGI adapter runs it in a pool of ASGI_WSGI_THREADS threads. The one
+exception is the admin change stream: its connections stay open for minutes,
+so it is served here as a coroutine rather than from a thread. Admin pages
+only open it with CHANGE_FEED_TRANSPORT=stream; by default they poll.
+
+The async views keep using the Flask templates, forms, flash messages and
+session cookie. Each one runs inside a Flask request context built from the
+ASGI request, so the before/after_request hooks still apply: metrics, request
+IDs, the access log, compression and the session cookie. Their reads always
+go to the primary database; the read replica is used by the Flask side only.
+
+The async views build their Flask request context from the ASGI scope, so
+ProxyFix never sees them. Behind a reverse proxy, uvicorn must apply the
+X-Forwarded-For and X-Forwarded-Proto headers itself (--proxy-headers, trusting
+only the proxy's address), or the access log and external URLs see the
+proxy instead of the client. The proxy must also pass the original
+Host header through, since uvicorn ignores X-Forwarded-Host.
+
+This needs starlette, python-multipart, a2wsgi, greenlet, an ASGI server and
+aiosqlite or asyncpg, which the ``asgi`` extra installs (pip install '.[asgi]').
+The sync deployment needs none of them.
+"""
+import io
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from a2wsgi import WSGIMiddleware
+from flask import abort, flash, redirect, render_template, session, url_for
+from flask_login import current_user
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import FileStorage, MultiDict
+
+from app import app, db
+from change_feed import (FeedReader, changes_after_query, event_frame, late_changes_query, late_ids_query,
+                         latest_cursor_query)
+from db_routing import LAST_WRITE_SESSION_KEY
+from duplicates import blocking_keys, describe_duplicates, duplicate_candidates, rank_duplicates
+from forms import CrewProfileDocumentForm, CrewRegistrationForm, TrackingForm
+from invalidation_bus import PENDING_KEY, bus
+from metrics import instrument_engine
+from models import CrewMember
+from routes import CREW_PROFILE_FILES, CREW_REGISTRATION_FILES, crew_member_from_form, document_label
+from storage import get_storage
+from upload_batch import UploadBatch
+
+
+# SQLAlchemy backend name -> async driver
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+# Methods for which Flask-WTF treats a form as submitted
+SUBMIT_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+class AsyncDatabase:
+    """Async engine on the database the Flask app uses, created per worker process"""
+
+    def __init__(self):
+        self.engine = None
+        self._sessions = None
+
+    def start(self):
+        with app.app_context():
+            url = db.engine.url  # Relative SQLite paths are already resolved against the instance folder
+        backend = url.get_backend_name()
+        if backend not in ASYNC_DRIVERS:
+            raise RuntimeError(f'No async driver configured for {backend} databases')
+        self.engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[backend]),
+                                          **app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+        self._sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        instrument_engine(self.engine.sync_engine)
+
+    async def stop(self):
+        await self.engine.dispose()
+
+    def session(self):
+        return self._sessions()
+
+
+async_db = AsyncDatabase()
+
+
+async def commit(db_session):
+    """Commit, then do what RoutingSession's commit hooks do for Flask views"""
+    await db_session.commit()
+    session[LAST_WRITE_SESSION_KEY] = time.time()
+    events = db_session.info.pop(PENDING_KEY, None)
+    if events:
+        await run_in_threadpool(bus.publish, events)
+
+
+async def find_duplicates(db_session, target, limit=20):
+    keys = blocking_keys(target)
+    if not keys:
+        return []
+    return rank_duplicates(target, await db_session.execute(duplicate_candidates(keys, limit)), limit)
+
+
+async def form_data(request):
+    """Form fields and files of a submitted request, as Flask-WTF would pass them"""
+    if request.method not in SUBMIT_METHODS:
+        return None
+    length = request.headers.get('content-length')
+    if length is None:
+        abort(411)
+    if not length.isdigit():
+        abort(400)
+    if app.config['MAX_CONTENT_LENGTH'] and int(length) > app.config['MAX_CONTENT_LENGTH']:
+        abort(413)
+
+    data = MultiDict()
+    for name, value in (await request.form()).multi_items():
+        if isinstance(value, UploadFile):
+            value = FileStorage(value.file, filename=value.filename, name=name, content_type=value.content_type)
+        data.add(name, value)
+    return data
+
+
+def flask_context(request):
+    """Flask request context mirroring request; Starlette reads the body itself"""
+    return app.test_request_context(
+        request.url.path, base_url=f'{request.url.scheme}://{request.url.netloc}', method=request.method,
+        query_string=request.url.query, headers=request.headers.items(), input_stream=io.BytesIO(),
+        environ_base={'REMOTE_ADDR': request.client.host if request.client else ''},
+        environ_overrides={'CONTENT_LENGTH': request.headers.get('content-length', '')})
+
+
+def starlette_response(response):
+    """Starlette response carrying a finished Flask response"""
+    result = Response(response.get_data(), status_code=response.status_code)
+    result.raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                          for name, value in response.headers.items()]
+    return result
+
+
+def public_view(view):
+    """Starlette endpoint for an async Flask-style view
+
+    The view may use flash(), url_for(), abort() and render_template() and
+    return anything a Flask view can.
+    """
+    async def endpoint(request):
+        try:
+            with flask_context(request):
+                try:
+                    try:
+                        rv = app.preprocess_request()
+                        if rv is None:
+                            rv = await view(request, **request.path_params)
+                    except Exception as e:
+                        rv = app.handle_user_exception(e)
+                    response = app.finalize_request(rv)
+                except Exception as e:
+                    response = app.handle_exception(e)
+                return starlette_response(response)
+        finally:
+            await request.close()
+
+    endpoint.__name__ = view.__name__
+    return endpoint
+
+
+async def index(request):
+    """Home page"""
+    return render_template('index.html')
+
+
+async def register_crew(request):
+    """Crew member registration"""
+    form = CrewRegistrationForm(formdata=await form_data(request))
+    if not form.validate_on_submit():
+        return render_template('register_crew.html', form=form)
+
+    async with async_db.session() as db_session:
+        passport = form.passport.data.upper() if form.passport.data else ''
+        if await db_session.scalar(select(CrewMember.id).filter_by(passport=passport).limit(1)):
+            flash('A crew member with this passport number already exists.', 'error')
+            return render_template('register_crew.html', form=form)
+
+        crew_member = crew_member_from_form(form)
+        duplicates = await find_duplicates(db_session, crew_member)
+        if duplicates:
+            crew_member.screening_notes = describe_duplicates(duplicates)
+            app.logger.info('Crew registration %s flagged as a likely duplicate', crew_member.passport)
+
+        uploads = {name: getattr(form, name).data for name in CREW_REGISTRATION_FILES if getattr(form, name).data}
+        with UploadBatch('crew') as batch:
+            for field_name, filename in (await run_in_threadpool(batch.save, uploads)).items():
+                setattr(crew_member, field_name, filename)
+
+            db_session.add(crew_member)
+            await db_session.flush()
+            crew_member.assign_profile_token()  # One commit instead of the sync view's two
+            await commit(db_session)
+
+    flash('Registration successful! Your application has been submitted. Our team will review your profile and contact you with the next steps.', 'success')
+    return redirect(url_for('track_status', passport=crew_member.passport))
+
+
+async def track_status(request):
+    """Track application status"""
+    form = TrackingForm(formdata=await form_data(request))
+    crew_member = None
+    passport_param = request.query_params.get('passport')
+
+    if passport_param:
+        form.passport.data = passport_param
+
+    if form.validate_on_submit() or passport_param:
+        passport = form.passport.data or passport_param
+        async with async_db.session() as db_session:
+            crew_member = await db_session.scalar(
+                select(CrewMember).filter_by(passport=passport.upper() if passport else '').limit(1))
+        if not crew_member:
+            flash('No crew member found with this passport number.', 'error')
+
+    return render_template('track_status.html', form=form, crew_member=crew_member)
+
+
+async def crew_private_profile(request, crew_id, token):
+    """Crew member private profile for document uploads"""
+    # The whole body is read before a database connection is taken
+    formdata = await form_data(request)
+
+    async with async_db.session() as db_session:
+        crew_member = await db_session.get(CrewMember, crew_id)
+        if crew_member is None:
+            abort(404)
+        if not crew_member.profile_token or crew_member.profile_token != token:
+            flash('Invalid or expired profile link.', 'error')
+            return redirect(url_for('index'))
+
+        document_form = CrewProfileDocumentForm(formdata=formdata)
+        if request.method == 'POST' and document_form.validate_on_submit():
+            uploads = {name: getattr(document_form, name).data
+                       for name in CREW_PROFILE_FILES if getattr(document_form, name).data}
+            if uploads:
+                with UploadBatch('crew') as batch:
+                    saved = await run_in_threadpool(batch.save, uploads)
+                    for field_name, filename in saved.items():
+                        setattr(crew_member, field_name, filename)
+                    crew_member.updated_at = datetime.utcnow()
+                    await commit(db_session)
+                flash(f'Successfully uploaded: {", ".join(document_label(name) for name in saved)}', 'success')
+            else:
+                flash('No files were selected for upload.', 'warning')
+
+            return redirect(url_for('crew_private_profile', crew_id=crew_id, token=token))
+
+    return render_template('crew_private_profile.html',
+                           crew_member=crew_member,
+                           document_form=document_form,
+                           direct_uploads=get_storage().supports_presigned_urls)
+
+
+async def iter_event_stream(cursor):
+    """Async counterpart of change_feed.iter_event_stream"""
+    poll = app.config['CHANGE_STREAM_POLL_SECONDS']
+    heartbeat = app.config['CHANGE_STREAM_HEARTBEAT_SECONDS']
+    deadline = time.monotonic() + app.config['CHANGE_STREAM_MAX_SECONDS']
+    last_sent = time.monotonic()
+
+    reader = FeedReader(cursor)
+    async with async_db.session() as db_session:
+        reader.skip((await db_session.execute(late_ids_query(cursor))).all())
+
+    yield f'retry: {int(poll * 1000)}\n\n'
+    while time.monotonic() < deadline:
+        async with async_db.session() as db_session:
+            late = (await db_session.scalars(late_changes_query(reader.cursor))).all()
+            after = (await db_session.scalars(
+                changes_after_query(reader.cursor, app.config['CHANGE_FEED_PAGE_SIZE']))).all()
+        changes = reader.unseen(late + after)
+        for change in changes:
+            yield event_frame(change)
+        if changes:
+            last_sent = time.monotonic()
+            continue
+        if time.monotonic() - last_sent >= heartbeat:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(poll)
+
+
+async def admin_changes_stream(request):
+    """Push change feed events to open admin pages over Server-Sent Events"""
+    with flask_context(request):
+        # The admin identity is cached, so this rarely touches the database
+        if not current_user.is_authenticated:
+            return Response('Login required', status_code=401)
+
+    cursor = request.headers.get('last-event-id') or request.query_params.get('since')
+    if cursor is None or not cursor.isdigit():
+        async with async_db.session() as db_session:
+            cursor = await db_session.scalar(latest_cursor_query()) or 0
+    return StreamingResponse(iter_event_stream(int(cursor)), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@asynccontextmanager
+async def lifespan(_):
+    async_db.start()
+    yield
+    await async_db.stop()
+
+
+application = Starlette(routes=[
+    Route('/', public_view(index)),
+    Route('/register/crew', public_view(register_crew), methods=['GET', 'POST']),
+    Route('/track', public_view(track_status), methods=['GET', 'POST']),
+    Route('/my-profile/{crew_id:int}-{token}', public_view(crew_private_profile), methods=['GET', 'POST']),
+    Route('/admin/api/changes/stream', admin_changes_stream),
+    Mount('', app=WSGIMiddleware(app, workers=app.config['ASGI_WSGI_THREADS'])),
+], lifespan=lifespan)
@@ -0,0 +1,8 @@
+"""Synthetic dataset generator and in-process load driver.
+
+Usage:
+
+    python -m benchmarks --crew 100000 --staff 10000 --concurrency 1,8,32 --output run.json
+
+Results are written as JSON so runs can be compared between releases.
+"""
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import argparse
+import shutil
+import platform
+import tempfile
+from datetime import datetime
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Maricheck load benchmark')
+    parser.add_argument('--database-url', help='database to benchmark (default: a fresh SQLite file)')
+    parser.add_argument('--upload-folder', help='upload folder (default: a temporary directory)')
+    parser.add_argument('--crew', type=int, default=100_000)
+    parser.add_argument('--staff', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--documents', action='store_true', help='write document files for generated crew')
+    parser.add_argument('--skip-generate', action='store_true', help='reuse an already populated database')
+    parser.add_argument('--concurrency', default='1,8,32', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and level')
+    parser.add_argument('--export-requests', type=int, default=5, help='requests per level for CSV export')
+    parser.add_argument('--scenarios', help='comma-separated subset of scenarios to run')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='maricheck_bench_')
+    try:
+        return run(args, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args, workdir):
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+
+    # Imported late so the app binds to the benchmark database
+    from app import app, db
+    import models
+    from benchmarks.generator import populate
+    from benchmarks.driver import SCENARIOS, run_scenario
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['UPLOAD_FOLDER'] = args.upload_folder or os.path.join(workdir, 'uploads')
+
+    if not args.skip_generate:
+        with app.app_context():
+            populate(db, models, crew=args.crew, staff=args.staff, seed=args.seed,
+                     documents=args.documents, upload_folder=app.config['UPLOAD_FOLDER'])
+
+    dataset = {'crew': args.crew, 'staff': args.staff}
+    scenarios = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    results = []
+    for name in scenarios:
+        requests = args.export_requests if name == 'export_crew_csv' else args.requests
+        for concurrency in levels:
+            result = run_scenario(app, name, concurrency, requests, dataset, seed=args.seed)
+            results.append(result)
+            print(f"{name:24} c={concurrency:<3} p50={result['p50_ms']}ms p95={result['p95_ms']}ms "
+                  f"p99={result['p99_ms']}ms {result['throughput_rps']} req/s", file=sys.stderr)
+
+    report = {
+        'started_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0],
+        'dataset': {'crew': args.crew, 'staff': args.staff, 'seed': args.seed, 'documents': args.documents},
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
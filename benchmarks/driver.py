@@ -0,0 +1,117 @@
+import io
+import time
+import random
+import itertools
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.generator import passport_for, profile_token_for
+
+
+_registration_ids = itertools.count()
+
+
+def _register_crew(client, rng, dataset):
+    n = next(_registration_ids)
+    # Unique contact details and birth dates, so registrations are not all flagged as
+    # duplicates of each other or of an earlier run against the same database
+    date_of_birth = date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 40))
+    return client.post('/register/crew', data={
+        'name': f'Load Test {n}', 'nationality': 'Indian', 'date_of_birth': date_of_birth.isoformat(),
+        'mobile_number': f'+91 7{rng.randrange(10 ** 9):09d}',
+        'email': f'load{n}-{rng.randrange(10 ** 6):06d}@bench.example.com',
+        'rank': 'AB Seaman', 'passport': f'LT{n:08d}{rng.randrange(10 ** 6):06d}',
+        'years_experience': '5', 'availability_date': '2026-01-01',
+    })
+
+
+def _track_status(client, rng, dataset):
+    return client.get(f"/track?passport={passport_for(rng.randrange(dataset['crew']))}")
+
+
+def _private_profile_upload(client, rng, dataset):
+    index = rng.randrange(dataset['crew'])
+    # Crew ids start at 1 on a freshly generated database
+    path = f'/my-profile/{index + 1}-{profile_token_for(index)}'
+    return client.post(path, data={
+        'medical_certificate_file': (io.BytesIO(b'%PDF-1.4\n' + rng.randbytes(50_000)), 'medical.pdf'),
+    })
+
+
+def _admin_crew_list(client, rng, dataset):
+    return client.get(f'/admin/crew?page={rng.randrange(1, 20)}')
+
+
+def _admin_search(client, rng, dataset):
+    return client.get(f"/admin/crew?search={rng.choice(['Sharma', 'Captain', 'BP0001', 'Cook'])}")
+
+
+def _export_crew_csv(client, rng, dataset):
+    return client.get('/admin/crew/export')
+
+
+# name -> (request function, needs admin login)
+SCENARIOS = {
+    'register_crew': (_register_crew, False),
+    'track_status': (_track_status, False),
+    'private_profile_upload': (_private_profile_upload, False),
+    'admin_crew_list': (_admin_crew_list, True),
+    'admin_search': (_admin_search, True),
+    'export_crew_csv': (_export_crew_csv, True),
+}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def run_scenario(app, name, concurrency, requests, dataset, seed=42):
+    """Issue requests for one scenario across concurrency workers and summarize latencies"""
+    func, needs_admin = SCENARIOS[name]
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client_for_thread():
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+            local.rng = random.Random(f'{seed}-{name}-{threading.get_ident()}')
+            if needs_admin:
+                client.post('/admin/login', data={'username': 'admin', 'password': 'admin123'})
+        return client
+
+    def one_request(_):
+        nonlocal errors
+        client = client_for_thread()
+        start = time.perf_counter()
+        response = func(client, local.rng, dataset)
+        response.get_data()  # Streamed bodies such as the CSV export are generated while being read
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one_request, range(requests)))
+    wall = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'throughput_rps': round(requests / wall, 2) if wall else None,
+    }
@@ -0,0 +1,153 @@
+import os
+import random
+import hashlib
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from utils import upload_dir
+
+
+RANKS = ['Fresher', 'Captain', 'Chief Officer', 'Second Officer', 'Third Officer', 'Chief Engineer',
+         'Second Engineer', 'Third Engineer', 'Bosun', 'AB Seaman', 'Ordinary Seaman', 'Cook',
+         'Steward', 'Oiler', 'Wiper']
+NATIONALITIES = ['Indian', 'Filipino', 'Ukrainian', 'Indonesian', 'Chinese', 'Myanmar', 'Russian']
+FIRST_NAMES = ['Arjun', 'Maria', 'Oleksandr', 'Budi', 'Wei', 'Aung', 'Ivan', 'Rahul', 'Jose', 'Anita']
+LAST_NAMES = ['Sharma', 'Santos', 'Kovalenko', 'Santoso', 'Zhang', 'Min', 'Petrov', 'Nair', 'Reyes']
+DEPARTMENTS = ['Ops', 'HR', 'Tech', 'Crewing']
+CREW_STATUSES = [0, 1, 2, 3, -1, -2]
+STAFF_STATUSES = [1, 3, -1]
+CREW_DOCUMENT_FIELDS = ['passport_file', 'cdc_file', 'resume_file', 'photo_file', 'medical_certificate_file']
+
+BASE_DATE = datetime(2024, 1, 1)
+
+
+def passport_for(index):
+    """Deterministic passport number for the crew row at index"""
+    return f'BP{index:08d}'
+
+
+def profile_token_for(index):
+    """Deterministic profile token for the crew row at index"""
+    return hashlib.sha256(f'bench-{index}'.encode()).hexdigest()
+
+
+def _document_bytes(rng, extension, size):
+    """Placeholder document body with a plausible file signature"""
+    header = b'%PDF-1.4\n' if extension == '.pdf' else b'\xff\xd8\xff\xe0'
+    return header + rng.randbytes(max(size - len(header), 0))
+
+
+def generate_crew_rows(count, seed=42, documents=False, upload_folder=None):
+    """Yield crew_members rows; optionally write matching document files"""
+    rng = random.Random(seed)
+    for i in range(count):
+        created_at = BASE_DATE + timedelta(minutes=i * 5)
+        row = {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'rank': rng.choice(RANKS),
+            'passport': passport_for(i),
+            'nationality': rng.choice(NATIONALITIES),
+            'date_of_birth': date(1960, 1, 1) + timedelta(days=rng.randrange(365 * 40)),
+            'years_experience': rng.randrange(0, 35),
+            'last_vessel_type': rng.choice(['Bulk Carrier', 'Tanker', 'Container', None]),
+            'next_available_port': rng.choice(['Mumbai', 'Manila', 'Odessa', None]),
+            'availability_date': date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+            'mobile_number': f'+91 9{rng.randrange(10 ** 9):09d}',
+            'email': f'crew{i}@bench.example.com',
+            'email_normalized': f'crew{i}@bench.example.com',
+            'profile_token': profile_token_for(i),
+            'status': rng.choice(CREW_STATUSES),
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+        row['mobile_e164'] = row['mobile_number'].replace(' ', '')
+        for field in CREW_DOCUMENT_FIELDS:
+            row[field] = None
+            if documents and rng.random() < 0.6:
+                extension = '.jpg' if field == 'photo_file' else '.pdf'
+                prefix = f'crew_{i:08x}_{field}'
+                relative = f'{upload_dir("crew", prefix)}/{prefix}{extension}'
+                path = os.path.join(upload_folder, relative)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(_document_bytes(rng, extension, rng.randrange(20_000, 400_000)))
+                row[field] = relative
+        yield row
+
+
+def generate_staff_rows(count, seed=42):
+    """Yield staff_members rows"""
+    rng = random.Random(seed + 1)
+    for i in range(count):
+        created_at = BASE_DATE + timedelta(minutes=i * 30)
+        row = {
+            'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email_or_whatsapp': f'staff{i}@bench.example.com',
+            'email_normalized': f'staff{i}@bench.example.com',
+            'position_applying': rng.choice(['Crewing Executive', 'Port Captain', 'HR Officer']),
+            'department': rng.choice(DEPARTMENTS),
+            'years_experience': rng.randrange(0, 30),
+            'location': rng.choice(['Mumbai', 'Manila', 'Singapore', 'Dubai']),
+            'availability_date': date(2025, 1, 1) + timedelta(days=rng.randrange(365)),
+            'mobile_number': f'+91 8{rng.randrange(10 ** 9):09d}',
+            'status': rng.choice(STAFF_STATUSES),
+            'created_at': created_at,
+            'updated_at': created_at,
+        }
+        row['mobile_e164'] = row['mobile_number'].replace(' ', '')
+        yield row
+
+
+def _bulk_insert(db, table, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            db.session.execute(insert(table), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(insert(table), batch)
+        db.session.commit()
+
+
+def seed_change_events(db, models, seed=42, batch_size=5000):
+    """Write the change_events rows that registrations and status changes would have written"""
+    rng = random.Random(seed + 2)
+    table = models.ChangeEvent.__table__
+    for model, entity, label in ((models.CrewMember, 'crew', 'name'), (models.StaffMember, 'staff', 'full_name')):
+        registered = model(status=model.__table__.c.status.default.arg).get_status_name()
+        last_id = 0
+        while True:
+            rows = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            events = []
+            for row in rows:
+                events.append({'entity': entity, 'entity_id': row.id, 'kind': 'created',
+                               'label': getattr(row, label), 'detail': registered, 'created_at': row.created_at})
+                if row.get_status_name() != registered:
+                    events.append({'entity': entity, 'entity_id': row.id, 'kind': 'status',
+                                   'label': getattr(row, label), 'detail': row.get_status_name(),
+                                   'created_at': row.created_at + timedelta(hours=rng.randrange(1, 24 * 30))})
+            db.session.execute(insert(table), events)
+            db.session.commit()
+
+
+def populate(db, models, crew=100_000, staff=10_000, seed=42, documents=False, upload_folder=None,
+             batch_size=5000):
+    """Fill an empty database with the synthetic dataset
+
+    The bulk inserts skip the mapper events that fill the side tables, so the
+    change feed and the duplicate-detection index are filled afterwards, as
+    a deployment of this size would have them.
+    """
+    from duplicates import rebuild_index
+
+    _bulk_insert(db, models.CrewMember.__table__,
+                 generate_crew_rows(crew, seed, documents, upload_folder), batch_size)
+    _bulk_insert(db, models.StaffMember.__table__, generate_staff_rows(staff, seed), batch_size)
+    seed_change_events(db, models, seed, batch_size)
+    rebuild_index(batch_size)
@@ -0,0 +1,150 @@
+"""Legitimate admin login latency during a credential-stuffing burst.
+
+A fixed pool of threads stands in for the server's workers. Attackers keep
+that pool saturated with wrong-password logins against existing admin
+accounts from a handful of IPs, while legitimate admins log in periodically
+from their own IPs. The legitimate latency is measured without an attack, then
+under attack with the login throttle disabled and enabled:
+
+    python -m benchmarks.login_attack --workers 4 --warmup 5 --duration 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.driver import percentile
+
+
+TARGET_ACCOUNTS = 8
+LEGIT_ACCOUNTS = 20
+LEGIT_PASSWORD = 'correct-horse'
+
+
+def create_accounts(db, models):
+    """Accounts for the attackers to guess against and for legitimate logins"""
+    from werkzeug.security import generate_password_hash
+    password_hash = generate_password_hash(LEGIT_PASSWORD)
+    for n in range(TARGET_ACCOUNTS):
+        db.session.add(models.Admin(username=f'target{n}', password_hash=password_hash))
+    for n in range(LEGIT_ACCOUNTS):
+        db.session.add(models.Admin(username=f'staff{n}', password_hash=password_hash))
+    db.session.commit()
+
+
+def run_attack(app, attack, throttled, workers, duration, warmup, attacker_ips, legit_interval):
+    from login_throttle import login_throttle
+
+    app.config['LOGIN_THROTTLE_ENABLED'] = throttled
+    login_throttle.reset()
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    in_flight = threading.BoundedSemaphore(workers * 4)
+    stop = threading.Event()
+    attack_codes = {}
+    codes_lock = threading.Lock()
+    legit_latencies = []
+    legit_failures = 0
+
+    def attack_request(n):
+        try:
+            response = app.test_client().post(
+                '/admin/login',
+                data={'username': f'target{n % TARGET_ACCOUNTS}', 'password': 'wrong-password'},
+                environ_base={'REMOTE_ADDR': f'203.0.113.{n % attacker_ips + 1}'})
+            with codes_lock:
+                attack_codes[response.status_code] = attack_codes.get(response.status_code, 0) + 1
+        finally:
+            in_flight.release()
+
+    def attacker():
+        n = 0
+        while not stop.is_set():
+            in_flight.acquire()
+            pool.submit(attack_request, n)
+            n += 1
+
+    def legit_request(n):
+        # Spread over several admins so their own per-username buckets never trip
+        return app.test_client().post(
+            '/admin/login', data={'username': f'staff{n % LEGIT_ACCOUNTS}', 'password': LEGIT_PASSWORD},
+            environ_base={'REMOTE_ADDR': f'198.51.100.{n % LEGIT_ACCOUNTS + 1}'})
+
+    attack_thread = threading.Thread(target=attacker, daemon=True)
+    if attack:
+        attack_thread.start()
+        # Let the attack reach steady state before measuring
+        time.sleep(warmup)
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        response = pool.submit(legit_request, len(legit_latencies)).result()
+        legit_latencies.append(time.perf_counter() - start)
+        if response.status_code != 302:
+            legit_failures += 1
+        time.sleep(legit_interval * random.random() * 2)
+
+    stop.set()
+    if attack:
+        attack_thread.join()
+    pool.shutdown(wait=True)
+
+    legit_latencies.sort()
+    return {
+        'attack': attack,
+        'throttled': throttled,
+        'workers': workers,
+        'legit_logins': len(legit_latencies),
+        'legit_failures': legit_failures,
+        'legit_p50_ms': round(percentile(legit_latencies, 50) * 1000, 2),
+        'legit_p95_ms': round(percentile(legit_latencies, 95) * 1000, 2),
+        'legit_p99_ms': round(percentile(legit_latencies, 99) * 1000, 2),
+        'attack_requests': sum(attack_codes.values()),
+        'attack_status_codes': attack_codes,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.login_attack')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds of attack before measuring')
+    parser.add_argument('--attacker-ips', type=int, default=2)
+    parser.add_argument('--legit-interval', type=float, default=0.25, help='mean seconds between admin logins')
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='maricheck_login_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    try:
+        from app import app, db
+        import models
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['LOGIN_THROTTLE_BACKEND'] = 'memory'
+        with app.app_context():
+            create_accounts(db, models)
+
+        results = [run_attack(app, attack, throttled, args.workers, args.duration, args.warmup,
+                              args.attacker_ips, args.legit_interval)
+                   for attack, throttled in ((False, True), (True, False), (True, True))]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps({'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Concurrent slow-client uploads against the sync and the ASGI stack.
+
+Each simulated applicant opens their private profile page to get the CSRF
+token and session cookie. They then upload a document, sending the request
+body in small chunks with a pause after each one, as a phone on a poor
+connection would. Meanwhile a probe requests the home page at a fixed
+interval, which shows whether fast requests still get a worker. Both stacks
+run the same number of worker processes against the same database:
+
+    python -m benchmarks.slow_clients --workers 4 --clients 64 --duration 30
+
+The sync stack is gunicorn's sync workers serving main:app. The ASGI stack is
+uvicorn serving asgi:application. Both servers must be installed.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from http.cookies import SimpleCookie
+
+from benchmarks.driver import percentile
+from benchmarks.generator import profile_token_for
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STACKS = {
+    'sync': lambda workers, port: [sys.executable, '-m', 'gunicorn', '--workers', str(workers),
+                                   '--worker-class', 'sync', '--timeout', '300',
+                                   '--bind', f'127.0.0.1:{port}', 'main:app'],
+    'asgi': lambda workers, port: [sys.executable, '-m', 'uvicorn', '--workers', str(workers),
+                                   '--host', '127.0.0.1', '--port', str(port), '--no-access-log',
+                                   'asgi:application'],
+}
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(stack, workers, env):
+    """Start a server for stack and wait until it answers"""
+    port = free_port()
+    process = subprocess.Popen(STACKS[stack](workers, port), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'The {stack} server exited with status {process.returncode}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            if connection.getresponse().status == 200:
+                return process, port
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'The {stack} server did not start within 60 seconds')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def multipart_body(fields, file_field, filename, content):
+    boundary = f'----maricheck{random.getrandbits(64):016x}'
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+                 f'filename="{filename}"\r\nContent-Type: application/pdf\r\n\r\n'.encode())
+    parts.append(content)
+    parts.append(f'\r\n--{boundary}--\r\n'.encode())
+    return f'multipart/form-data; boundary={boundary}', b''.join(parts)
+
+
+def slow_upload(port, index, size, chunk_size, chunk_delay, timeout):
+    """Fetch the profile page, then trickle a document upload; returns the POST status"""
+    path = f'/my-profile/{index + 1}-{profile_token_for(index)}'
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', path)
+        page = connection.getresponse()
+        html = page.read().decode('utf-8', 'replace')
+        cookies = SimpleCookie(page.getheader('Set-Cookie') or '')
+        token = CSRF_PATTERN.search(html)
+        if page.status != 200 or token is None:
+            return page.status
+
+        content = b'%PDF-1.4\n' + random.randbytes(size)
+        content_type, body = multipart_body({'csrf_token': token.group(1)},
+                                            'medical_certificate_file', 'medical.pdf', content)
+        connection.putrequest('POST', path)
+        connection.putheader('Content-Type', content_type)
+        connection.putheader('Content-Length', str(len(body)))
+        if cookies:
+            connection.putheader('Cookie', '; '.join(f'{name}={morsel.value}' for name, morsel in cookies.items()))
+        connection.endheaders()
+        for offset in range(0, len(body), chunk_size):
+            connection.send(body[offset:offset + chunk_size])
+            time.sleep(chunk_delay)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_stack(stack, workers, env, args):
+    process, port = start_server(stack, workers, env)
+    stop = threading.Event()
+    lock = threading.Lock()
+    upload_latencies = []
+    upload_errors = 0
+    probe_latencies = []
+    probe_failures = 0
+
+    def client(n):
+        nonlocal upload_errors
+        rng = random.Random(f'{args.seed}-{n}')
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                status = slow_upload(port, rng.randrange(args.crew), args.upload_kb * 1024,
+                                     args.chunk_kb * 1024, args.chunk_delay, args.timeout)
+            except OSError:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status == 302:
+                    upload_latencies.append(elapsed)
+                else:
+                    upload_errors += 1
+
+    def probe():
+        nonlocal probe_failures
+        while not stop.wait(args.probe_interval):
+            start = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=args.timeout)
+                connection.request('GET', '/')
+                ok = connection.getresponse().status == 200
+                connection.close()
+            except OSError:
+                ok = False
+            if ok:
+                probe_latencies.append(time.perf_counter() - start)
+            else:
+                probe_failures += 1
+
+    threads = [threading.Thread(target=client, args=(n,), daemon=True) for n in range(args.clients)]
+    threads.append(threading.Thread(target=probe, daemon=True))
+    try:
+        wall_start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        # Uploads still in flight may finish; only those counted before the deadline matter
+        with lock:
+            completed = sorted(upload_latencies)
+            errors = upload_errors
+        wall = time.perf_counter() - wall_start
+        for thread in threads:
+            thread.join(timeout=args.timeout)
+    finally:
+        stop_server(process)
+
+    probes = sorted(probe_latencies)
+    return {
+        'stack': stack,
+        'workers': workers,
+        'clients': args.clients,
+        'uploads': len(completed),
+        'upload_errors': errors,
+        'uploads_per_second': round(len(completed) / wall, 2),
+        'upload_p50_ms': round(percentile(completed, 50) * 1000, 2) if completed else None,
+        'upload_p95_ms': round(percentile(completed, 95) * 1000, 2) if completed else None,
+        'probe_requests': len(probes),
+        'probe_failures': probe_failures,
+        'probe_p50_ms': round(percentile(probes, 50) * 1000, 2) if probes else None,
+        'probe_p95_ms': round(percentile(probes, 95) * 1000, 2) if probes else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.slow_clients')
+    parser.add_argument('--database-url', help='database to serve (default: a fresh SQLite file)')
+    parser.add_argument('--stacks', default='sync,asgi', help='comma-separated stacks to run')
+    parser.add_argument('--workers', type=int, default=4, help='server worker processes')
+    parser.add_argument('--clients', type=int, default=64, help='concurrent slow clients')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per stack')
+    parser.add_argument('--crew', type=int, default=1000, help='crew rows to generate')
+    parser.add_argument('--upload-kb', type=int, default=200, help='size of each uploaded document')
+    parser.add_argument('--chunk-kb', type=int, default=16, help='bytes sent per chunk')
+    parser.add_argument('--chunk-delay', type=float, default=0.1, help='seconds between chunks')
+    parser.add_argument('--probe-interval', type=float, default=1.0, help='seconds between home page probes')
+    parser.add_argument('--timeout', type=float, default=120.0, help='socket timeout per request')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write JSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='maricheck_slow_bench_')
+    env = dict(os.environ,
+               DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+               INVALIDATION_BUS='local',
+               LOG_LEVEL='WARNING')
+    env.pop('DATABASE_REPLICA_URL', None)
+    try:
+        os.environ.update(DATABASE_URL=env['DATABASE_URL'], INVALIDATION_BUS='local')
+        from app import app, db
+        import models
+        from benchmarks.generator import populate
+        with app.app_context():
+            populate(db, models, crew=args.crew, staff=0, seed=args.seed)
+
+        results = []
+        for stack in args.stacks.split(','):
+            result = run_stack(stack, args.workers, env, args)
+            results.append(result)
+            print(f"{stack:5} uploads={result['uploads']} ({result['uploads_per_second']}/s) "
+                  f"errors={result['upload_errors']} probe p95={result['probe_p95_ms']}ms "
+                  f"failures={result['probe_failures']}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'upload_kb': args.upload_kb,
+        'chunk_kb': args.chunk_kb,
+        'chunk_delay': args.chunk_delay,
+        'duration': args.duration,
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
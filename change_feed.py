@@ -0,0 +1,172 @@
+"""Cursor-based feed of crew and staff changes for live admin views.
+
+Write paths append ChangeEvent rows in the same transaction as the change
+itself, so the feed never shows uncommitted work. Clients page through it by
+event id (``/admin/api/changes?since=``), which is what the admin pages poll
+by default. With CHANGE_FEED_TRANSPORT=stream they hold one Server-Sent
+Events connection instead. That only suits the ASGI deployment (asgi.py),
+which serves the stream on its event loop; under sync workers every open tab
+would hold a worker.
+
+PostgreSQL assigns ids when rows are inserted, not when they commit, so an
+event can become visible after a larger id was already read. Every read
+therefore also returns the events of the last CHANGE_FEED_OVERLAP_SECONDS
+behind the cursor, and consumers drop the ids they have already seen.
+created_at is stamped at insert, so the window has to outlast the longest
+write transaction.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert, inspect, select
+
+from app import app, db
+from models import CrewMember, StaffMember, ChangeEvent
+
+
+# model -> (entity name, display name attribute)
+FEED_MODELS = {
+    CrewMember: ('crew', 'name'),
+    StaffMember: ('staff', 'full_name'),
+}
+
+
+def _file_columns(model):
+    return [column.key for column in model.__table__.columns if column.key.endswith('_file')]
+
+
+def _append(connection, target, kind, detail=None):
+    entity, label_attr = FEED_MODELS[type(target)]
+    connection.execute(insert(ChangeEvent.__table__).values(
+        entity=entity, entity_id=target.id, kind=kind,
+        label=getattr(target, label_attr), detail=detail))
+
+
+def _after_insert(mapper, connection, target):
+    _append(connection, target, 'created', target.get_status_name())
+
+
+def _after_update(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.status.history.has_changes():
+        _append(connection, target, 'status', target.get_status_name())
+    uploaded = [key for key in _file_columns(type(target))
+                if state.attrs[key].history.has_changes() and getattr(target, key)]
+    if uploaded:
+        _append(connection, target, 'upload', ','.join(uploaded))
+
+
+for _model in FEED_MODELS:
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+
+
+def serialize(change):
+    return {
+        'id': change.id,
+        'entity': change.entity,
+        'entity_id': change.entity_id,
+        'kind': change.kind,
+        'label': change.label,
+        'detail': change.detail,
+        'created_at': change.created_at.isoformat(),
+    }
+
+
+def event_frame(change):
+    """Server-Sent Events frame for one event"""
+    return f'id: {change.id}\nevent: change\ndata: {json.dumps(serialize(change))}\n\n'
+
+
+def latest_cursor_query():
+    return select(db.func.max(ChangeEvent.id))
+
+
+def latest_cursor():
+    """Id of the newest event, or 0 for an empty feed"""
+    return db.session.scalar(latest_cursor_query()) or 0
+
+
+def _overlap_start():
+    return datetime.utcnow() - timedelta(seconds=app.config['CHANGE_FEED_OVERLAP_SECONDS'])
+
+
+def late_changes_query(cursor):
+    """Recent events at or behind cursor, which may have committed after it was read"""
+    return (select(ChangeEvent).where(ChangeEvent.id <= cursor, ChangeEvent.created_at >= _overlap_start())
+            .order_by(ChangeEvent.id))
+
+
+def late_ids_query(cursor):
+    """Ids and times of the late window, to seed a reader that already has them"""
+    return select(ChangeEvent.id, ChangeEvent.created_at).where(
+        ChangeEvent.id <= cursor, ChangeEvent.created_at >= _overlap_start())
+
+
+def changes_after_query(cursor, limit):
+    """Up to limit events with an id greater than cursor, oldest first"""
+    return select(ChangeEvent).where(ChangeEvent.id > cursor).order_by(ChangeEvent.id).limit(limit)
+
+
+def changes_since(cursor, limit):
+    """(late events behind cursor, up to limit events after it)"""
+    return (db.session.scalars(late_changes_query(cursor)).all(),
+            db.session.scalars(changes_after_query(cursor, limit)).all())
+
+
+class FeedReader:
+    """A consumer's position: the largest id read plus the recent ids already delivered"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.seen = {}
+
+    def skip(self, changes):
+        """Mark changes as delivered without returning them"""
+        self.unseen(changes)
+
+    def unseen(self, changes):
+        """The changes not delivered before, oldest first; advances the cursor"""
+        start = _overlap_start()
+        self.seen = {change_id: created_at for change_id, created_at in self.seen.items() if created_at >= start}
+        fresh = [change for change in changes if change.id not in self.seen]
+        for change in changes:
+            self.seen[change.id] = change.created_at
+            self.cursor = max(self.cursor, change.id)
+        return sorted(fresh, key=lambda change: change.id)
+
+
+def iter_event_stream(cursor):
+    """Yield SSE frames for new events until the stream's lifetime runs out
+
+    Each poll runs in its own short transaction so an idle connection holds
+    no locks or snapshots. The stream closes after CHANGE_STREAM_MAX_SECONDS
+    and the browser reconnects with Last-Event-ID, which keeps long-lived
+    connections from pinning a worker indefinitely. This holds a sync worker
+    for the stream's lifetime; asgi.py serves the same frames asynchronously.
+    """
+    poll = app.config['CHANGE_STREAM_POLL_SECONDS']
+    heartbeat = app.config['CHANGE_STREAM_HEARTBEAT_SECONDS']
+    deadline = time.monotonic() + app.config['CHANGE_STREAM_MAX_SECONDS']
+    last_sent = time.monotonic()
+
+    # Recent events behind the cursor were delivered before a reconnect
+    reader = FeedReader(cursor)
+    reader.skip(db.session.execute(late_ids_query(cursor)).all())
+    db.session.rollback()
+
+    yield f'retry: {int(poll * 1000)}\n\n'
+    while time.monotonic() < deadline:
+        late, after = changes_since(reader.cursor, app.config['CHANGE_FEED_PAGE_SIZE'])
+        db.session.rollback()
+        changes = reader.unseen(late + after)
+        for change in changes:
+            yield event_frame(change)
+        if changes:
+            last_sent = time.monotonic()
+            continue
+        if time.monotonic() - last_sent >= heartbeat:
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(poll)
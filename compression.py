@@ -0,0 +1,87 @@
+"""Response compression for HTML pages, admin lists and exports.
+
+Buffered responses above COMPRESS_MIN_SIZE are compressed in one go;
+streamed responses (CSV exports) are compressed chunk by chunk so they keep
+streaming. Brotli is used when the client accepts it and the optional
+``brotli`` package (the ``brotli`` extra) is installed, otherwise gzip.
+"""
+import zlib
+
+from flask import request
+
+from app import app
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'application/x-ndjson', 'image/svg+xml',
+}
+
+
+def supported_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding():
+    """Best encoding accepted by the client, or None"""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress an iterable of chunks without buffering the whole body"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses for clients that accept it"""
+    if not app.config['COMPRESS_ENABLED']:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 304) or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        level = app.config['COMPRESS_STREAM_LEVEL']
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+        level = app.config['COMPRESS_BR_QUALITY'] if encoding == 'br' else app.config['COMPRESS_LEVEL']
+        response.set_data(compress(data, encoding, level))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,129 @@
+"""Normalized shadow columns for applicant contact details.
+
+Emails are stored stripped and lowercased, phone numbers in E.164. The shadow
+columns are filled in on every insert and update and are indexed, so support
+lookups by email or WhatsApp number are exact index matches. The optional
+``phonenumbers`` package (the ``phonenumbers`` extra) is used for parsing when
+installed.
+"""
+import re
+
+import click
+from sqlalchemy import event, or_, update
+
+from app import app, db
+from invalidation_bus import BUS_MODELS, bus
+from models import CrewMember, StaffMember
+
+try:
+    import phonenumbers
+except ImportError:  # phonenumbers is optional
+    phonenumbers = None
+
+
+def normalize_email(value):
+    """Stripped, lowercased email, or None if value is not an email"""
+    value = (value or '').strip().lower()
+    return value if '@' in value else None
+
+
+def to_e164(value, country_code=None):
+    """Phone number in E.164 form, or None if it cannot be one"""
+    raw = (value or '').strip()
+    if not raw:
+        return None
+    country_code = country_code or app.config['PHONE_DEFAULT_COUNTRY_CODE']
+
+    if phonenumbers is not None:
+        region = phonenumbers.region_code_for_country_code(int(country_code))
+        try:
+            number = phonenumbers.parse(raw, region)
+        except phonenumbers.NumberParseException:
+            return None
+        if not phonenumbers.is_possible_number(number):
+            return None
+        return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+    digits = re.sub(r'\D', '', raw)
+    if raw.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]  # International dialling prefix
+    else:
+        digits = country_code + digits.lstrip('0')  # National number with trunk prefix
+    return f'+{digits}' if 8 <= len(digits) <= 15 else None
+
+
+def crew_contact_columns(crew_member):
+    return {
+        'email_normalized': normalize_email(crew_member.email),
+        'mobile_e164': to_e164(crew_member.mobile_number),
+    }
+
+
+def staff_contact_columns(staff_member):
+    email = normalize_email(staff_member.email_or_whatsapp)
+    return {
+        'email_normalized': email,
+        'whatsapp_e164': None if email else to_e164(staff_member.email_or_whatsapp),
+        'mobile_e164': to_e164(staff_member.mobile_number),
+    }
+
+
+CONTACT_COLUMNS = {
+    CrewMember: crew_contact_columns,
+    StaffMember: staff_contact_columns,
+}
+
+
+def _fill_contact_columns(mapper, connection, target):
+    for column, value in CONTACT_COLUMNS[type(target)](target).items():
+        setattr(target, column, value)
+
+
+for _model in CONTACT_COLUMNS:
+    event.listen(_model, 'before_insert', _fill_contact_columns)
+    event.listen(_model, 'before_update', _fill_contact_columns)
+
+
+def backfill_contacts(batch_size=500):
+    """Fill the shadow columns of existing rows in id order; returns rows updated"""
+    updated = 0
+    for model, compute in CONTACT_COLUMNS.items():
+        last_id = 0
+        while True:
+            rows = model.query.filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            last_id = ids[-1]
+            # Keep updated_at so delta exports do not re-send every row
+            db.session.execute(update(model), [
+                {'id': row.id, 'updated_at': row.updated_at, **compute(row)} for row in rows])
+            db.session.commit()
+            # A bulk update skips the mapper events that feed the invalidation bus
+            bus.publish([(BUS_MODELS[model], row_id) for row_id in ids])
+            updated += len(rows)
+    return updated
+
+
+def lookup_contact(query, limit=50):
+    """Crew and staff members whose normalized email or phone matches query"""
+    email = normalize_email(query)
+    if email:
+        crew_filter = CrewMember.email_normalized == email
+        staff_filter = StaffMember.email_normalized == email
+    else:
+        phone = to_e164(query)
+        if not phone:
+            return [], []
+        crew_filter = CrewMember.mobile_e164 == phone
+        staff_filter = or_(StaffMember.mobile_e164 == phone, StaffMember.whatsapp_e164 == phone)
+    return (CrewMember.query.filter(crew_filter).order_by(CrewMember.id).limit(limit).all(),
+            StaffMember.query.filter(staff_filter).order_by(StaffMember.id).limit(limit).all())
+
+
+@app.cli.command('backfill-contacts')
+def backfill_contacts_command():
+    """Recompute normalized email and phone columns for every applicant."""
+    click.echo(f'Updated {backfill_contacts()} row(s)')
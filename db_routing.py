@@ -0,0 +1,66 @@
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+
+REPLICA_BIND_KEY = 'replica'
+LAST_WRITE_SESSION_KEY = '_db_last_write'
+
+
+class RoutingSession(Session):
+    """Session that sends reads from read-only views to the replica bind.
+
+    Views opt in with the ``read_only`` decorator. Everything else, every
+    flush, and any request made shortly after the same user wrote something
+    goes to the primary. Locally this can be exercised with two SQLite files:
+    point DATABASE_REPLICA_URL at a copy of the primary database file.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            engine = self._db.engines.get(REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_only(view):
+    """Mark a view as safe to serve from the read replica"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _use_replica():
+    """Check whether the current request may read from the replica"""
+    if not has_request_context() or not g.get('db_read_only'):
+        return False
+    if g.get('db_wrote'):
+        return False
+
+    # Read-your-writes: stay on the primary for a while after this user wrote
+    last_write = session.get(LAST_WRITE_SESSION_KEY)
+    window = current_app.config.get('REPLICA_READ_YOUR_WRITES_SECONDS', 0)
+    if last_write and time.time() - last_write < window:
+        return False
+
+    return True
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    """Remember that this request has written to the primary"""
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_write(db_session):
+    """Open the read-your-writes window once a write is committed"""
+    if has_request_context() and g.get('db_wrote'):
+        session[LAST_WRITE_SESSION_KEY] = time.time()
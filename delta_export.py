@@ -0,0 +1,147 @@
+"""Delta exports of crew and staff rows changed after an (updated_at, id) watermark.
+
+updated_at is stamped when a row is flushed, not when its transaction
+commits, so a row can become visible after an export has already moved the
+watermark past it. Each export therefore starts DELTA_EXPORT_OVERLAP_SECONDS
+before the watermark and sends those rows again. Consumers must apply rows
+as upserts keyed by ID; a repeated row or tombstone is then harmless.
+"""
+import csv
+import json
+from io import StringIO
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, event, insert
+
+from app import app, db
+from models import CrewMember, StaffMember, DeletedRecord
+
+
+CREW_COLUMNS = [
+    ('ID', 'id'), ('Name', 'name'), ('Rank', 'rank'), ('Passport', 'passport'),
+    ('Nationality', 'nationality'), ('Date of Birth', 'date_of_birth'),
+    ('Years Experience', 'years_experience'), ('Mobile Number', 'mobile_number'),
+    ('Email', 'email'), ('Status', 'get_status_name'), ('Created At', 'created_at'),
+    ('Updated At', 'updated_at'),
+]
+
+STAFF_COLUMNS = [
+    ('ID', 'id'), ('Full Name', 'full_name'), ('Position Applying', 'position_applying'),
+    ('Department', 'department'), ('Years Experience', 'years_experience'),
+    ('Location', 'location'), ('Mobile Number', 'mobile_number'),
+    ('Email/WhatsApp', 'email_or_whatsapp'), ('Status', 'get_status_name'),
+    ('Created At', 'created_at'), ('Updated At', 'updated_at'),
+]
+
+# entity -> (model, export columns)
+ENTITIES = {
+    'crew': (CrewMember, CREW_COLUMNS),
+    'staff': (StaffMember, STAFF_COLUMNS),
+}
+
+
+def parse_watermark(since, after_id):
+    """Parse the (updated_at, id) watermark from query parameters"""
+    if not since:
+        return None
+    return datetime.fromisoformat(since), int(after_id or 0)
+
+
+def rewind(watermark):
+    """Start of the next export: the overlap window before watermark"""
+    if watermark is None:
+        return None
+    return watermark[0] - timedelta(seconds=app.config['DELTA_EXPORT_OVERLAP_SECONDS']), 0
+
+
+def _after(timestamp_column, id_column, watermark):
+    """Keyset condition: (timestamp, id) > watermark"""
+    since, after_id = watermark
+    return or_(timestamp_column > since, and_(timestamp_column == since, id_column > after_id))
+
+
+def _at_or_before(timestamp_column, id_column, bound):
+    """Keyset condition: (timestamp, id) <= bound"""
+    until, until_id = bound
+    return or_(timestamp_column < until, and_(timestamp_column == until, id_column <= until_id))
+
+
+def upper_bound(entity):
+    """Newest (timestamp, id) among live rows and tombstones of an entity"""
+    model, _ = ENTITIES[entity]
+    candidates = [
+        db.session.query(model.updated_at, model.id)
+        .order_by(model.updated_at.desc(), model.id.desc()).first(),
+        db.session.query(DeletedRecord.deleted_at, DeletedRecord.entity_id)
+        .filter(DeletedRecord.entity == entity)
+        .order_by(DeletedRecord.deleted_at.desc(), DeletedRecord.entity_id.desc()).first(),
+    ]
+    candidates = [tuple(row) for row in candidates if row is not None and row[0] is not None]
+    return max(candidates) if candidates else None
+
+
+def iter_changes(entity, watermark, bound):
+    """Yield (record dict, deleted flag) for rows changed after watermark, up to bound"""
+    if bound is None:
+        return
+    model, columns = ENTITIES[entity]
+
+    query = model.query.filter(_at_or_before(model.updated_at, model.id, bound))
+    if watermark:
+        query = query.filter(_after(model.updated_at, model.id, watermark))
+    for row in query.order_by(model.updated_at, model.id).yield_per(1000):
+        record = {}
+        for header, attr in columns:
+            value = getattr(row, attr)
+            record[header] = value() if callable(value) else value
+        yield record, False
+
+    tombstones = DeletedRecord.query.filter(
+        DeletedRecord.entity == entity,
+        _at_or_before(DeletedRecord.deleted_at, DeletedRecord.entity_id, bound),
+    )
+    if watermark:
+        tombstones = tombstones.filter(_after(DeletedRecord.deleted_at, DeletedRecord.entity_id, watermark))
+    for tombstone in tombstones.order_by(DeletedRecord.deleted_at, DeletedRecord.entity_id).yield_per(1000):
+        yield {'ID': tombstone.entity_id, 'Updated At': tombstone.deleted_at}, True
+
+
+def iter_delta_csv(entity, changes, batch_size=500):
+    """Render changes as CSV with a trailing Deleted column"""
+    _, columns = ENTITIES[entity]
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow([header for header, _ in columns] + ['Deleted'])
+
+    for count, (record, deleted) in enumerate(changes, 1):
+        writer.writerow([record.get(header, '') for header, _ in columns] + [1 if deleted else 0])
+        if count % batch_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+
+    yield output.getvalue()
+
+
+def iter_delta_jsonl(changes, batch_size=500):
+    """Render changes as JSON lines; tombstones carry "Deleted": true"""
+    lines = []
+    for record, deleted in changes:
+        record['Deleted'] = deleted
+        lines.append(json.dumps(record, default=str))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _record_tombstone(entity):
+    def listener(mapper, connection, target):
+        connection.execute(insert(DeletedRecord.__table__).values(
+            entity=entity, entity_id=target.id, deleted_at=datetime.utcnow()))
+    return listener
+
+
+event.listen(CrewMember, 'after_delete', _record_tombstone('crew'))
+event.listen(StaffMember, 'after_delete', _record_tombstone('staff'))
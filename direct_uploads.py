@@ -0,0 +1,70 @@
+"""Direct-to-storage document uploads for object storage backends.
+
+The browser asks for a presigned POST, sends the file straight to the bucket
+and then confirms the upload, at which point the object is checked and the
+crew member's ``*_file`` column is pointed at it. Document bytes never pass
+through the app servers. The confirm token is signed, so a client can only
+attach the object key it was issued to its own profile and field. The bucket
+needs a CORS rule allowing POST from the site's origin.
+
+Direct uploads skip image normalization, since the app never sees the bytes.
+"""
+from datetime import datetime
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from app import db
+from resumable_uploads import UploadError, allowed_extensions
+from storage import get_storage
+from utils import unique_upload_name, upload_dir
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='direct-upload')
+
+
+def presign_upload(crew_member, field, filename, size):
+    """Presigned POST for one document plus the token that confirms it"""
+    storage = get_storage()
+    if not storage.supports_presigned_urls:
+        raise UploadError(404, 'Direct uploads are not available')
+
+    extensions = allowed_extensions(field or '')
+    if extensions is None:
+        raise UploadError(400, 'Unknown document field')
+    unique_prefix, ext = unique_upload_name(filename or '', 'crew')
+    if ext.lower().lstrip('.') not in extensions:
+        raise UploadError(415, 'File type not allowed for this document')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError(400, 'File size is required')
+    if size > current_app.config['MAX_CONTENT_LENGTH']:
+        raise UploadError(413, 'File is too large')
+
+    key = f'{upload_dir("crew", unique_prefix)}/{unique_prefix}{ext}'
+    post = storage.presigned_upload(key, current_app.config['MAX_CONTENT_LENGTH'])
+    token = _serializer().dumps({'crew': crew_member.id, 'field': field, 'key': key})
+    return {'url': post['url'], 'fields': post['fields'], 'token': token}
+
+
+def confirm_upload(crew_member, token):
+    """Attach a directly uploaded object to its document field; returns the field"""
+    max_age = current_app.config['S3_PRESIGN_TTL'] + 3600
+    try:
+        claims = _serializer().loads(token or '', max_age=max_age)
+    except BadSignature:
+        raise UploadError(400, 'Invalid or expired upload token')
+    if claims['crew'] != crew_member.id:
+        raise UploadError(404, 'Unknown upload')
+
+    stat = get_storage().stat(claims['key'])
+    if stat is None:
+        raise UploadError(409, 'The file has not reached storage yet')
+    if stat[0] > current_app.config['MAX_CONTENT_LENGTH']:
+        get_storage().delete(claims['key'])
+        raise UploadError(413, 'File is too large')
+
+    setattr(crew_member, claims['field'], claims['key'])
+    crew_member.updated_at = datetime.utcnow()
+    db.session.commit()
+    return claims['field']
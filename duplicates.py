@@ -0,0 +1,221 @@
+"""Duplicate-applicant detection through a blocking index.
+
+Every crew and staff row gets a handful of blocking keys: normalized email,
+normalized mobile number and, for crew, a phonetic name key combined with the
+date of birth. Keys live in ``duplicate_keys`` and are rewritten on every
+insert or relevant update, so checking a registration is one indexed lookup.
+Run ``flask score-duplicates --rebuild`` once to index existing rows.
+"""
+import csv
+import re
+import sys
+import unicodedata
+from collections import defaultdict
+
+import click
+from sqlalchemy import delete, event, insert, inspect, select
+
+from app import app, db
+from contacts import normalize_email
+from models import CrewMember, StaffMember, DuplicateKey
+
+
+# Weight of each key kind when scoring a candidate pair
+KEY_SCORES = {'email': 3, 'mobile': 2, 'name_dob': 3}
+
+# Blocks larger than this (shared agency phone, placeholder email) carry no signal
+MAX_BLOCK_SIZE = 25
+
+_SOUNDEX_CODES = {}
+for _letters, _code in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _code
+
+
+def soundex(word):
+    """American Soundex code of a lowercase ASCII word"""
+    if not word:
+        return ''
+    code = word[0].upper()
+    previous = _SOUNDEX_CODES.get(word[0], '')
+    for letter in word[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def name_key(name):
+    """Order-independent phonetic key of a person's name"""
+    folded = unicodedata.normalize('NFKD', name or '').encode('ascii', 'ignore').decode().lower()
+    return ' '.join(sorted(soundex(token) for token in re.findall(r'[a-z]+', folded)))
+
+
+def normalize_mobile(value):
+    """National significant digits of a phone number, ignoring formatting and prefixes"""
+    digits = re.sub(r'\D', '', value or '').lstrip('0')
+    return digits[-10:] if len(digits) >= 7 else None
+
+
+def blocking_keys(target):
+    """Set of blocking keys for a CrewMember or StaffMember"""
+    keys = set()
+    if isinstance(target, CrewMember):
+        emails = [target.email]
+        mobiles = [target.mobile_number]
+        if target.date_of_birth and name_key(target.name):
+            keys.add(f'name_dob:{name_key(target.name)}|{target.date_of_birth.isoformat()}')
+    else:
+        emails = [target.email_or_whatsapp]
+        mobiles = [target.mobile_number]
+        if not normalize_email(target.email_or_whatsapp):
+            mobiles.append(target.email_or_whatsapp)  # WhatsApp number
+    keys.update(f'email:{email}' for email in map(normalize_email, emails) if email)
+    keys.update(f'mobile:{mobile}' for mobile in map(normalize_mobile, mobiles) if mobile)
+    return keys
+
+
+# model -> (entity name, attributes the keys are derived from)
+INDEXED_MODELS = {
+    CrewMember: ('crew', ('name', 'email', 'mobile_number', 'date_of_birth')),
+    StaffMember: ('staff', ('full_name', 'email_or_whatsapp', 'mobile_number')),
+}
+
+def find_duplicates(target, limit=20):
+    """Other rows sharing a blocking key with target, best match first
+
+    Returns a list of dicts with entity, entity_id, score and the matched key
+    kinds. target may be unsaved, which is how registrations are checked
+    before they are committed.
+    """
+    keys = blocking_keys(target)
+    if not keys:
+        return []
+    return rank_duplicates(target, db.session.execute(duplicate_candidates(keys, limit)), limit)
+
+
+def duplicate_candidates(keys, limit):
+    """Statement selecting the (entity, entity_id, key) rows indexed under keys"""
+    return (select(DuplicateKey.entity, DuplicateKey.entity_id, DuplicateKey.key)
+            .where(DuplicateKey.key.in_(keys)).limit(limit * len(keys)))
+
+
+def rank_duplicates(target, rows, limit):
+    """find_duplicates() result from duplicate_candidates() rows"""
+    own = (INDEXED_MODELS[type(target)][0], target.id)
+    matches = defaultdict(set)
+    for entity, entity_id, key in rows:
+        if (entity, entity_id) != own:
+            matches[(entity, entity_id)].add(key.split(':', 1)[0])
+
+    ranked = [
+        {'entity': entity, 'entity_id': entity_id, 'kinds': sorted(kinds),
+         'score': sum(KEY_SCORES[kind] for kind in kinds)}
+        for (entity, entity_id), kinds in matches.items()
+    ]
+    ranked.sort(key=lambda match: (-match['score'], match['entity'], match['entity_id']))
+    return ranked[:limit]
+
+
+def describe_duplicates(matches):
+    """One-line summary of find_duplicates() results for screening notes"""
+    return 'Possible duplicate of ' + '; '.join(
+        f"{match['entity']} #{match['entity_id']} ({', '.join(match['kinds'])})" for match in matches)
+
+
+def _write_keys(connection, entity, target):
+    keys = blocking_keys(target)
+    if keys:
+        connection.execute(insert(DuplicateKey.__table__), [
+            {'entity': entity, 'entity_id': target.id, 'key': key} for key in keys])
+
+
+def _clear_keys(connection, entity, entity_id):
+    connection.execute(delete(DuplicateKey.__table__).where(
+        DuplicateKey.entity == entity, DuplicateKey.entity_id == entity_id))
+
+
+def _after_insert(mapper, connection, target):
+    _write_keys(connection, INDEXED_MODELS[type(target)][0], target)
+
+
+def _after_update(mapper, connection, target):
+    entity, attributes = INDEXED_MODELS[type(target)]
+    state = inspect(target)
+    if any(state.attrs[attribute].history.has_changes() for attribute in attributes):
+        _clear_keys(connection, entity, target.id)
+        _write_keys(connection, entity, target)
+
+
+def _after_delete(mapper, connection, target):
+    _clear_keys(connection, INDEXED_MODELS[type(target)][0], target.id)
+
+
+for _model in INDEXED_MODELS:
+    event.listen(_model, 'after_insert', _after_insert)
+    event.listen(_model, 'after_update', _after_update)
+    event.listen(_model, 'after_delete', _after_delete)
+
+
+def rebuild_index(batch_size=1000):
+    """Recompute blocking keys for every row; returns the number of keys written"""
+    written = 0
+    db.session.execute(delete(DuplicateKey.__table__))
+    for model, (entity, _) in INDEXED_MODELS.items():
+        batch = []
+        for row in model.query.order_by(model.id).yield_per(batch_size):
+            batch.extend({'entity': entity, 'entity_id': row.id, 'key': key} for key in blocking_keys(row))
+            if len(batch) >= batch_size:
+                db.session.execute(insert(DuplicateKey.__table__), batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(DuplicateKey.__table__), batch)
+            written += len(batch)
+    db.session.commit()
+    return written
+
+
+def score_pairs(min_score, batch_size=5000):
+    """Score candidate pairs in one pass over the blocking index
+
+    Rows are bucketed by key, and only rows sharing a bucket are compared, so
+    the work grows with the number of keys rather than the square of the
+    table size. Oversized buckets are skipped.
+    """
+    blocks = defaultdict(list)
+    query = db.session.query(DuplicateKey.entity, DuplicateKey.entity_id, DuplicateKey.key)
+    for entity, entity_id, key in query.yield_per(batch_size):
+        blocks[key].append((entity, entity_id))
+
+    pairs = defaultdict(set)
+    for key, members in blocks.items():
+        if len(members) < 2 or len(members) > MAX_BLOCK_SIZE:
+            continue
+        kind = key.split(':', 1)[0]
+        members.sort()
+        for i, first in enumerate(members):
+            for second in members[i + 1:]:
+                pairs[(first, second)].add(kind)
+
+    for (first, second), kinds in sorted(pairs.items()):
+        score = sum(KEY_SCORES[kind] for kind in kinds)
+        if score >= min_score:
+            yield first, second, score, sorted(kinds)
+
+
+@app.cli.command('score-duplicates')
+@click.option('--rebuild', is_flag=True, help='Recompute the blocking index from the crew and staff tables first.')
+@click.option('--min-score', default=3, show_default=True, help='Only report pairs scoring at least this much.')
+def score_duplicates(rebuild, min_score):
+    """Write likely duplicate pairs as CSV to stdout."""
+    if rebuild:
+        click.echo(f'Indexed {rebuild_index()} blocking key(s)', err=True)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['Entity A', 'ID A', 'Entity B', 'ID B', 'Score', 'Matched On'])
+    for (entity_a, id_a), (entity_b, id_b), score, kinds in score_pairs(min_score):
+        writer.writerow([entity_a, id_a, entity_b, id_b, score, ' '.join(kinds)])
@@ -0,0 +1,153 @@
+"""Cache of rendered admin list rows.
+
+Each row of the crew and staff lists is rendered from its own partial
+template. cached_row() stores the HTML under (entity, id, updated_at), so any
+ORM write to the row changes the key and old entries simply stop being used.
+The key also includes a digest of the partial's source, so a deploy that
+changes the markup never serves old rows, and the request's host, because
+rows contain external links.
+
+Entries live in a per-process LRU of FRAGMENT_CACHE_SIZE rows. With
+FRAGMENT_CACHE_BACKEND=redis (requires the optional ``redis`` package, the ``redis`` extra) a miss
+in the LRU is looked up in Redis before rendering, so workers share rows.
+Hits and misses are exported as maricheck_fragment_cache_* counters.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+from markupsafe import Markup
+
+from app import app
+from metrics import fragment_cache_hits, fragment_cache_misses
+
+try:
+    import redis
+except ImportError:  # redis is optional
+    redis = None
+
+
+class LRUFragments:
+    """Bounded least-recently-used map of rendered fragments"""
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisFragments:
+    """Fragments shared by all workers; failures count as misses"""
+
+    def __init__(self, url, ttl):
+        if redis is None:
+            raise RuntimeError('FRAGMENT_CACHE_BACKEND=redis requires the redis package')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25)
+        self.ttl = ttl
+
+    def get(self, key):
+        try:
+            html = self.client.get(f'fragment:{key}')
+        except redis.RedisError:
+            app.logger.warning('Fragment cache read failed', exc_info=True)
+            return None
+        return html.decode('utf-8') if html is not None else None
+
+    def set(self, key, html):
+        try:
+            self.client.set(f'fragment:{key}', html.encode('utf-8'), ex=self.ttl)
+        except redis.RedisError:
+            app.logger.warning('Fragment cache write failed', exc_info=True)
+
+    def clear(self):
+        pass  # Entries expire; changed rows get new keys
+
+
+class FragmentCache:
+    """Two-tier cache of rendered rows: process LRU, then the shared backend"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = None
+        self._shared = None
+        self._digests = {}
+
+    def _tiers(self):
+        with self._lock:
+            if self._local is None:
+                self._local = LRUFragments(app.config['FRAGMENT_CACHE_SIZE'])
+                if app.config['FRAGMENT_CACHE_BACKEND'] == 'redis':
+                    self._shared = RedisFragments(app.config['FRAGMENT_CACHE_REDIS_URL'],
+                                                  app.config['FRAGMENT_CACHE_TTL'])
+            return self._local, self._shared
+
+    def _template_digest(self, template_name):
+        digest = self._digests.get(template_name)
+        if digest is None or app.jinja_env.auto_reload:
+            source = app.jinja_env.loader.get_source(app.jinja_env, template_name)[0]
+            digest = self._digests[template_name] = hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]
+        return digest
+
+    def key(self, template_name, obj):
+        updated_at = obj.updated_at.isoformat() if obj.updated_at else ''
+        return (f'{obj.__tablename__}:{obj.id}:{updated_at}:'
+                f'{self._template_digest(template_name)}:{request.host_url}')
+
+    def render(self, template_name, obj, **context):
+        """Rendered template_name for obj, from the cache when possible"""
+        entity = obj.__tablename__
+        template = app.jinja_env.get_template(template_name)
+        if not app.config['FRAGMENT_CACHE_ENABLED']:
+            return Markup(template.render(**context))
+
+        local, shared = self._tiers()
+        key = self.key(template_name, obj)
+        html = local.get(key)
+        if html is None and shared is not None:
+            html = shared.get(key)
+            if html is not None:
+                local.set(key, html)
+        if html is not None:
+            fragment_cache_hits.inc(entity)
+            return Markup(html)
+
+        fragment_cache_misses.inc(entity)
+        html = template.render(**context)
+        local.set(key, html)
+        if shared is not None:
+            shared.set(key, html)
+        return Markup(html)
+
+    def clear(self):
+        local, shared = self._tiers()
+        local.clear()
+        if shared is not None:
+            shared.clear()
+
+
+fragment_cache = FragmentCache()
+
+
+@app.template_global()
+def cached_row(template_name, obj, **context):
+    """Render a list row partial through the fragment cache"""
+    return fragment_cache.render(template_name, obj, **context)
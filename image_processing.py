@@ -0,0 +1,69 @@
+"""Upload-time normalization of image documents.
+
+Phone photos and scans are auto-oriented, downscaled to IMAGE_MAX_DIMENSION,
+stripped of EXIF/metadata and re-encoded as JPEG at IMAGE_JPEG_QUALITY. The
+work runs in a small shared thread pool so a burst of uploads cannot occupy
+every CPU. Pillow is optional (the ``images`` extra); without it images are
+stored unchanged.
+"""
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed
+    Image = None
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-normalize')
+        return _pool
+
+
+def should_normalize(extension):
+    """Check whether an upload with this extension gets normalized"""
+    return (Image is not None
+            and current_app.config['IMAGE_NORMALIZE_ENABLED']
+            and extension.lower() in IMAGE_EXTENSIONS)
+
+
+def _normalize(data, max_dimension, quality):
+    """Return re-encoded JPEG bytes, or None if the data is not a readable image"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                # Flatten transparency onto white, as documents are viewed on white
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            return output.getvalue()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def normalize_image(data):
+    """Normalize image bytes in the worker pool; returns JPEG bytes or None"""
+    config = current_app.config
+    pool = _get_pool(config['IMAGE_NORMALIZE_WORKERS'])
+    future = pool.submit(_normalize, data, config['IMAGE_MAX_DIMENSION'], config['IMAGE_JPEG_QUALITY'])
+    return future.result()
@@ -0,0 +1,264 @@
+"""Cross-worker invalidation of in-process caches.
+
+Every gunicorn worker keeps its own caches (admin identities today). When one
+worker commits a change to a crew, staff or admin row, the other workers have
+to drop what they cached about it. Mapper events collect the changed
+(entity, id) pairs during the flush, and after the commit the bus delivers
+them to local subscribers and publishes them to the other workers. A rolled
+back transaction publishes nothing. Registration, status updates, profile
+and resumable uploads go through the ORM and need no explicit calls.
+
+Bulk and Core statements on these tables (``update(model)`` with a list of
+rows, ``insert().from_select()``, ``delete()``) skip the mapper events. Code
+that issues them must call ``bus.publish`` with the affected pairs after it
+commits, as archival.py and contacts.backfill_contacts do; otherwise other
+workers keep serving stale entries for up to the cache TTL.
+
+INVALIDATION_BUS selects the transport:
+
+* ``postgres``: NOTIFY on a channel that every worker LISTENs on.
+* ``socket``: datagrams to one Unix socket per worker in
+  INVALIDATION_SOCKET_DIR. This covers a single host, including SQLite
+  deployments.
+* ``local``: this process only.
+* ``auto`` (default): ``postgres`` on PostgreSQL, otherwise ``socket``.
+
+A worker whose listener loses its connection invalidates everything once it
+reconnects, since it may have missed messages. This lets caches keep long
+TTLs safely.
+"""
+import os
+import json
+import atexit
+import select
+import socket
+import secrets
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import object_session
+
+from app import app, db
+from db_routing import RoutingSession
+from models import Admin, CrewMember, StaffMember
+
+
+CHANNEL = 'maricheck_invalidate'
+EVENTS_PER_MESSAGE = 100  # Keeps a NOTIFY payload well under its 8000 byte limit
+PENDING_KEY = 'invalidations'
+
+# model -> entity name used by subscribers
+BUS_MODELS = {CrewMember: 'crew', StaffMember: 'staff', Admin: 'admin'}
+
+
+class PostgresTransport:
+    """LISTEN/NOTIFY on the primary database"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def send(self, payloads):
+        with self.engine.begin() as conn:
+            for payload in payloads:
+                conn.execute(text('SELECT pg_notify(:channel, :payload)'),
+                             {'channel': CHANNEL, 'payload': payload})
+
+    def listen(self, handle, on_connect):
+        backoff = 1
+        while True:
+            try:
+                connection = self.engine.raw_connection()
+                connection.detach()  # Held for the worker's lifetime; keep it out of the pool
+                try:
+                    dbapi = connection.driver_connection
+                    dbapi.autocommit = True
+                    dbapi.cursor().execute(f'LISTEN {CHANNEL}')
+                    on_connect()
+                    backoff = 1
+                    while True:
+                        if select.select([dbapi], [], [], 30) == ([], [], []):
+                            continue
+                        dbapi.poll()
+                        while dbapi.notifies:
+                            handle(dbapi.notifies.pop(0).payload)
+                finally:
+                    connection.close()
+            except Exception:
+                app.logger.warning('Invalidation listener lost its connection; retrying in %ss',
+                                   backoff, exc_info=True)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+
+class SocketTransport:
+    """Datagrams to one Unix socket per worker in a shared directory"""
+
+    def __init__(self, directory, worker_id):
+        self.directory = directory
+        self.path = os.path.join(directory, f'{worker_id}.sock')
+        self._sender = None
+
+    def send(self, payloads):
+        if self._sender is None:
+            self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sender.setblocking(False)
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if not name.endswith('.sock') or path == self.path:
+                continue
+            for payload in payloads:
+                try:
+                    self._sender.sendto(payload.encode('utf-8'), path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # The worker is gone; remove its socket so nobody sends to it again
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    break
+                except BlockingIOError:
+                    app.logger.warning('Invalidation queue of %s is full; dropping a message', name)
+
+    def listen(self, handle, on_connect):
+        os.makedirs(self.directory, exist_ok=True)
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(self.path)
+        on_connect()
+        while True:
+            handle(receiver.recv(65536).decode('utf-8'))
+
+    def close(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class InvalidationBus:
+    """Delivers (entity, id) changes to cache subscribers in every worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        self._transport = None
+        self._pid = None
+        self._listening_pid = None
+        self.worker_id = None
+
+    def subscribe(self, entity, callback):
+        """Call callback(entity_id) when a row changes; entity_id None means all rows"""
+        self._subscribers[entity].append(callback)
+
+    def deliver(self, events):
+        """Run local subscribers for [(entity, entity_id), ...]"""
+        for entity, entity_id in events:
+            for callback in self._subscribers.get(entity, ()):
+                try:
+                    callback(entity_id)
+                except Exception:
+                    app.logger.exception('Cache invalidation for %s %s failed', entity, entity_id)
+
+    def deliver_all(self):
+        self.deliver([(entity, None) for entity in list(self._subscribers)])
+
+    def transport(self):
+        """Transport for this process, created after any fork"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self.worker_id = f'{os.getpid()}-{secrets.token_hex(4)}'
+                self._transport = self._create_transport()
+            return self._transport
+
+    def _create_transport(self):
+        backend = app.config['INVALIDATION_BUS']
+        if backend == 'auto':
+            backend = 'postgres' if db.engine.dialect.name == 'postgresql' else 'socket'
+        if backend == 'postgres':
+            return PostgresTransport(db.engine)
+        if backend == 'socket':
+            return SocketTransport(app.config['INVALIDATION_SOCKET_DIR'], self.worker_id)
+        if backend == 'local':
+            return None
+        raise RuntimeError(f'Unknown INVALIDATION_BUS: {backend}')
+
+    def publish(self, events):
+        """Deliver events here, then send them to the other workers"""
+        events = sorted(events)
+        self.deliver(events)
+        transport = self.transport()
+        if transport is None or not events:
+            return
+        payloads = [json.dumps({'src': self.worker_id, 'events': events[i:i + EVENTS_PER_MESSAGE]})
+                    for i in range(0, len(events), EVENTS_PER_MESSAGE)]
+        try:
+            transport.send(payloads)
+        except Exception:
+            app.logger.exception('Could not publish %d cache invalidation(s)', len(events))
+
+    def _handle(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        if message.get('src') != self.worker_id:
+            self.deliver([tuple(item) for item in message.get('events', [])])
+
+    def start(self):
+        """Start this worker's listener thread (once per process)"""
+        transport = self.transport()
+        with self._lock:
+            if transport is None or self._listening_pid == os.getpid():
+                return
+            self._listening_pid = os.getpid()
+        thread = threading.Thread(target=transport.listen, args=(self._handle, self.deliver_all),
+                                  name='invalidation-listener', daemon=True)
+        thread.start()
+
+    def stop(self):
+        transport = self._transport
+        if self._listening_pid == os.getpid() and hasattr(transport, 'close'):
+            transport.close()
+
+
+bus = InvalidationBus()
+
+
+def _record_change(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_KEY, set()).add((BUS_MODELS[type(target)], target.id))
+
+
+for _model in BUS_MODELS:
+    event.listen(_model, 'after_insert', _record_change)
+    event.listen(_model, 'after_update', _record_change)
+    event.listen(_model, 'after_delete', _record_change)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _publish_committed(db_session):
+    events = db_session.info.pop(PENDING_KEY, None)
+    if events:
+        bus.publish(events)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _discard_rolled_back(db_session):
+    db_session.info.pop(PENDING_KEY, None)
+
+
+@app.before_request
+def start_listener():
+    """Listen in serving workers only; CLI commands just publish"""
+    if app.config['INVALIDATION_BUS'] != 'local':
+        bus.start()
+
+
+atexit.register(bus.stop)
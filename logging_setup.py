@@ -0,0 +1,136 @@
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+
+from flask import g, has_request_context, request
+
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request ID to records created in a request"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """Keep only a sample of DEBUG records; other levels always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting and I/O to the listener thread
+
+    The stock handler runs the full formatter in the calling thread. Here only
+    the message arguments are merged, so mutable arguments are captured at call
+    time while JSON encoding and tracebacks are rendered off the request thread.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_levels(spec):
+    """Parse 'sqlalchemy.engine=WARNING,werkzeug=INFO' into a dict"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(app):
+    """Route all logging through a queue drained by a background listener thread"""
+    global _listener
+
+    level = app.config['LOG_LEVEL'].upper()
+    sample_rate = app.config['LOG_DEBUG_SAMPLE_RATE']
+
+    output = logging.StreamHandler(sys.stdout)
+    if app.config['LOG_FORMAT'] == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(request_id)s %(message)s',
+                                              defaults={'request_id': '-'}))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = RequestQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(DebugSampler(sample_rate))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for name, logger_level in app.config['LOG_LEVELS'].items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    # Flask's own logger would otherwise write synchronously to stderr
+    app.logger.handlers.clear()
+    app.logger.propagate = True
+
+    if _listener is not None:
+        _listener.stop()
+    else:
+        atexit.register(lambda: _listener.stop())
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+    @app.before_request
+    def assign_request_id():
+        """Reuse the caller's request ID or create one"""
+        g.request_id = request.headers.get(REQUEST_ID_HEADER, '')[:64] or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        """Echo the request ID and write one access log line"""
+        request_id = g.get('request_id')
+        started = g.get('request_started')
+        if request_id is None or started is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = request_id
+        app.logger.info('%s %s %s %.1fms', request.method, request.path, response.status_code,
+                        (time.perf_counter() - started) * 1000)
+        return response
@@ -0,0 +1,137 @@
+import time
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import delete, select, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import LoginThrottleBucket
+
+
+def _refill(tokens, updated_at, now, capacity, per_second):
+    return min(capacity, tokens + (now - updated_at) * per_second)
+
+
+def _idle_seconds():
+    """Idle time after which any bucket is full again, which is the same as having none"""
+    config = app.config
+    return max(config['LOGIN_THROTTLE_IP_CAPACITY'] * 60 / config['LOGIN_THROTTLE_IP_PER_MINUTE'],
+               config['LOGIN_THROTTLE_USER_CAPACITY'] * 60 / config['LOGIN_THROTTLE_USER_PER_MINUTE'])
+
+
+class MemoryBuckets:
+    """Token buckets held in this process, least recently used first
+
+    Buckets that have refilled are dropped, and at most
+    LOGIN_THROTTLE_MAX_BUCKETS are kept, so random usernames or addresses
+    cannot grow the map without limit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, per_second, now):
+        """Take one token; return 0 if granted, else seconds until one is available"""
+        with self._lock:
+            self._evict(now)
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, per_second)
+            granted = tokens >= 1
+            self._buckets[key] = (tokens - 1 if granted else tokens, now)
+            return 0 if granted else (1 - tokens) / per_second
+
+    def _evict(self, now):
+        idle_before = now - _idle_seconds()
+        while self._buckets:
+            key, (_, updated_at) = next(iter(self._buckets.items()))
+            if updated_at >= idle_before and len(self._buckets) < app.config['LOGIN_THROTTLE_MAX_BUCKETS']:
+                break
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBuckets:
+    """Token buckets in the login_throttle_buckets table, shared by all workers
+
+    Each worker deletes refilled rows every LOGIN_THROTTLE_SWEEP_SECONDS.
+    """
+
+    table = LoginThrottleBucket.__table__
+
+    def __init__(self):
+        self._last_sweep = 0.0
+
+    def take(self, key, capacity, per_second, now):
+        if now - self._last_sweep >= app.config['LOGIN_THROTTLE_SWEEP_SECONDS']:
+            self._last_sweep = now
+            self.sweep(now)
+        for _ in range(2):
+            try:
+                return self._take(key, capacity, per_second, now)
+            except IntegrityError:
+                # Another worker created the row first; retry against it
+                continue
+        return 0
+
+    def _take(self, key, capacity, per_second, now):
+        table = self.table
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.tokens, table.c.updated_at).where(table.c.key == key).with_for_update()
+            ).first()
+            if row is None:
+                conn.execute(insert(table).values(key=key, tokens=capacity - 1, updated_at=now))
+                return 0
+
+            tokens = _refill(row.tokens, row.updated_at, now, capacity, per_second)
+            granted = tokens >= 1
+            conn.execute(update(table).where(table.c.key == key).values(
+                tokens=tokens - 1 if granted else tokens, updated_at=now))
+            return 0 if granted else (1 - tokens) / per_second
+
+    def sweep(self, now):
+        """Delete buckets idle long enough to be full again"""
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.updated_at < now - _idle_seconds()))
+
+    def reset(self):
+        with db.engine.begin() as conn:
+            conn.execute(self.table.delete())
+
+
+class LoginThrottle:
+    """Per-IP and per-username token buckets checked before any password hashing"""
+
+    def __init__(self):
+        self._memory = MemoryBuckets()
+        self._database = DatabaseBuckets()
+
+    @property
+    def buckets(self):
+        if app.config['LOGIN_THROTTLE_BACKEND'] == 'database':
+            return self._database
+        return self._memory
+
+    def hit(self, ip, username):
+        """Record a login attempt; return 0 if allowed, else seconds to wait"""
+        if not app.config['LOGIN_THROTTLE_ENABLED']:
+            return 0
+
+        now = time.time()
+        wait = self.buckets.take(f'ip:{ip}', app.config['LOGIN_THROTTLE_IP_CAPACITY'],
+                                 app.config['LOGIN_THROTTLE_IP_PER_MINUTE'] / 60, now)
+        if wait:
+            return wait
+        return self.buckets.take(f'user:{(username or "").lower()}', app.config['LOGIN_THROTTLE_USER_CAPACITY'],
+                                 app.config['LOGIN_THROTTLE_USER_PER_MINUTE'] / 60, now)
+
+    def reset(self):
+        self.buckets.reset()
+
+
+login_throttle = LoginThrottle()
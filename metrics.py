@@ -0,0 +1,180 @@
+import time
+import threading
+from collections import defaultdict
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+
+from app import app, db
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+class Histogram:
+    """Thread-safe Prometheus-style histogram keyed by endpoint"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for endpoint, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{endpoint="{endpoint}"}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{endpoint="{endpoint}"}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """Thread-safe Prometheus-style counter keyed by endpoint (or another label)"""
+
+    def __init__(self, name, help_text, label='endpoint'):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, endpoint, amount=1):
+        with self._lock:
+            self._values[endpoint] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for endpoint, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{endpoint}"}} {value}')
+        return lines
+
+
+request_duration = Histogram('maricheck_request_duration_seconds',
+                             'Wall time spent handling a request.', DURATION_BUCKETS)
+sql_duration = Histogram('maricheck_request_sql_duration_seconds',
+                         'Time spent executing SQL per request.', DURATION_BUCKETS)
+sql_queries = Histogram('maricheck_request_sql_queries',
+                        'Number of SQL statements executed per request.', QUERY_COUNT_BUCKETS)
+template_duration = Histogram('maricheck_request_template_duration_seconds',
+                              'Time spent rendering templates per request.', DURATION_BUCKETS)
+upload_bytes = Counter('maricheck_upload_bytes_total',
+                       'Bytes received in multipart upload requests.')
+fragment_cache_hits = Counter('maricheck_fragment_cache_hits_total',
+                              'Admin list rows served from the fragment cache.', label='entity')
+fragment_cache_misses = Counter('maricheck_fragment_cache_misses_total',
+                                'Admin list rows rendered because they were not cached.', label='entity')
+
+ALL_METRICS = [request_duration, sql_duration, sql_queries, template_duration, upload_bytes,
+               fragment_cache_hits, fragment_cache_misses]
+
+
+def render_metrics():
+    """Render all collected metrics in the Prometheus text format"""
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@app.before_request
+def start_request_timer():
+    """Reset the per-request counters"""
+    g.metrics_start = time.perf_counter()
+    g.metrics_sql_count = 0
+    g.metrics_sql_time = 0.0
+    g.metrics_template_time = 0.0
+
+
+def _observe(endpoint, total, counters):
+    request_duration.observe(endpoint, total)
+    sql_duration.observe(endpoint, counters.metrics_sql_time)
+    sql_queries.observe(endpoint, counters.metrics_sql_count)
+    template_duration.observe(endpoint, counters.metrics_template_time)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request in the histograms and add a Server-Timing header
+
+    A streamed body (exports, downloads) runs its queries after this hook,
+    so it is recorded when the response is closed instead, and gets no
+    Server-Timing header.
+    """
+    start = g.get('metrics_start')
+    if start is None:
+        return response
+
+    endpoint = request.endpoint or 'unknown'
+    if request.method == 'POST' and request.mimetype == 'multipart/form-data':
+        upload_bytes.inc(endpoint, request.content_length or 0)
+
+    if response.is_streamed:
+        # stream_with_context keeps this g current while the body runs, so its counters keep growing
+        counters = g._get_current_object()
+        response.call_on_close(lambda: _observe(endpoint, time.perf_counter() - start, counters))
+        return response
+
+    total = time.perf_counter() - start
+    _observe(endpoint, total, g)
+
+    if app.config.get('SERVER_TIMING_ENABLED', True):
+        response.headers['Server-Timing'] = ', '.join([
+            f'app;dur={total * 1000:.1f}',
+            f'db;dur={g.metrics_sql_time * 1000:.1f};desc="{g.metrics_sql_count} queries"',
+            f'tpl;dur={g.metrics_template_time * 1000:.1f}',
+        ])
+
+    return response
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_query_start = time.perf_counter()
+
+
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'metrics_query_start', None)
+    if start is not None and has_request_context() and 'metrics_start' in g:
+        g.metrics_sql_count += 1
+        g.metrics_sql_time += time.perf_counter() - start
+
+
+def instrument_engine(engine):
+    """Count and time the queries of engine in the request metrics"""
+    event.listen(engine, 'before_cursor_execute', _start_query_timer)
+    event.listen(engine, 'after_cursor_execute', _stop_query_timer)
+
+
+# The primary and the replica; asgi.py adds its async engine
+for _engine in db.engines.values():
+    instrument_engine(_engine)
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    g.metrics_template_start = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def _stop_template_timer(sender, template, context, **extra):
+    start = g.pop('metrics_template_start', None)
+    if start is not None and 'metrics_start' in g:
+        g.metrics_template_time += time.perf_counter() - start
@@ -0,0 +1,75 @@
+"""Additive schema migrations.
+
+db.create_all() only creates missing tables, so columns and indexes added to
+existing models are applied here. Every step checks the live schema first and
+is safe to run on each start-up, on SQLite and PostgreSQL alike.
+"""
+from sqlalchemy import inspect, text
+
+from app import app, db
+from contacts import backfill_contacts
+
+
+def add_column(table, column, ddl):
+    """Add a column unless it already exists"""
+    if column in {c['name'] for c in inspect(db.engine).get_columns(table)}:
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    app.logger.info('Added column %s.%s', table, column)
+    return True
+
+
+def add_index(name, table, columns):
+    """Create an index unless it already exists"""
+    if name in {index['name'] for index in inspect(db.engine).get_indexes(table)}:
+        return False
+    with db.engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX {name} ON {table} ({", ".join(columns)})'))
+    app.logger.info('Added index %s on %s', name, table)
+    return True
+
+
+# (table, column, column DDL) in the order they were introduced
+COLUMNS = [
+    ('admins', 'session_version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('crew_members', 'email_normalized', 'VARCHAR(120)'),
+    ('crew_members', 'mobile_e164', 'VARCHAR(16)'),
+    ('staff_members', 'email_normalized', 'VARCHAR(128)'),
+    ('staff_members', 'whatsapp_e164', 'VARCHAR(16)'),
+    ('staff_members', 'mobile_e164', 'VARCHAR(16)'),
+]
+
+# (index name, table, columns) in the order they were introduced
+INDEXES = [
+    ('ix_crew_members_updated_at_id', 'crew_members', ['updated_at', 'id']),
+    ('ix_staff_members_updated_at_id', 'staff_members', ['updated_at', 'id']),
+    ('ix_crew_members_email_normalized', 'crew_members', ['email_normalized']),
+    ('ix_crew_members_mobile_e164', 'crew_members', ['mobile_e164']),
+    ('ix_staff_members_email_normalized', 'staff_members', ['email_normalized']),
+    ('ix_staff_members_whatsapp_e164', 'staff_members', ['whatsapp_e164']),
+    ('ix_staff_members_mobile_e164', 'staff_members', ['mobile_e164']),
+    ('ix_crew_members_created_at', 'crew_members', ['created_at']),
+    ('ix_staff_members_created_at', 'staff_members', ['created_at']),
+    ('ix_change_events_kind_created_at', 'change_events', ['kind', 'created_at']),
+    ('ix_change_events_entity_id', 'change_events', ['entity', 'entity_id', 'id']),
+    ('ix_change_events_created_at', 'change_events', ['created_at']),
+    ('ix_login_throttle_buckets_updated_at', 'login_throttle_buckets', ['updated_at']),
+]
+
+# Columns derived from existing data; adding any of them triggers a backfill
+CONTACT_COLUMNS = {
+    ('crew_members', 'email_normalized'), ('crew_members', 'mobile_e164'),
+    ('staff_members', 'email_normalized'), ('staff_members', 'whatsapp_e164'),
+    ('staff_members', 'mobile_e164'),
+}
+
+
+def run_migrations():
+    """Bring an existing database up to the current models"""
+    added = {(table, column) for table, column, ddl in COLUMNS if add_column(table, column, ddl)}
+    for name, table, columns in INDEXES:
+        add_index(name, table, columns)
+    
+    if added & CONTACT_COLUMNS:
+        app.logger.info('Backfilled contact columns on %d row(s)', backfill_contacts())
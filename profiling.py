@@ -0,0 +1,160 @@
+"""On-demand cProfile capture of single requests.
+
+Admins flag a request with ``X-Profile: 1`` or ``?_profile=1``, and
+PROFILE_SAMPLE_RATE samples ordinary traffic. Profiles are pstats files in
+PROFILE_DIR, listed under /admin/profiles. Only one request per process is
+profiled at a time: cProfile hooks the interpreter, and on Python 3.12+ a
+second active profiler raises. Requests that arrive while one runs, and async
+views on the ASGI event loop (whose profile would include every other
+coroutine), are served unprofiled.
+"""
+import io
+import os
+import time
+import uuid
+import random
+import pstats
+import cProfile
+import asyncio
+import threading
+from datetime import datetime
+
+from flask import g, request
+from flask_login import current_user
+
+from app import app
+
+
+PROFILE_SUFFIX = '.pstats'
+_rotate_lock = threading.Lock()
+_active_lock = threading.Lock()  # Held while a request is being profiled
+
+
+def profile_dir():
+    """Directory holding saved profiles"""
+    return app.config['PROFILE_DIR']
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _wants_profile():
+    """Profile on an admin's explicit request or for a sampled share of traffic"""
+    if request.endpoint == 'static':
+        return False
+    flagged = request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1'
+    if flagged and current_user.is_authenticated:
+        return True
+    rate = app.config.get('PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+@app.before_request
+def start_profiler():
+    """Start cProfile for this request if requested"""
+    if not _wants_profile() or _on_event_loop() or not _active_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except (ValueError, RuntimeError):  # Another profiler (e.g. a debugger's) is active
+        _active_lock.release()
+        app.logger.warning('Skipped profiling %s: another profiler is active', request.path)
+        return
+    g.profiler = profiler
+    g.profiler_start = time.perf_counter()
+
+
+def _save_profile(profiler, start, endpoint):
+    """Stop profiler, write it to the profile directory and return its name"""
+    profiler.disable()
+    _active_lock.release()
+    elapsed_ms = int((time.perf_counter() - start) * 1000)
+    name = f"{time.strftime('%Y%m%d_%H%M%S')}_{endpoint or 'unknown'}_{elapsed_ms}ms_{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, name))
+    rotate_profiles()
+    return name
+
+
+@app.after_request
+def stop_profiler(response):
+    """Stop the profiler and save the result
+
+    A streamed body (exports, downloads) is generated after this hook, so
+    its profiler keeps running until the response is closed. Its headers are
+    sent before that, so it gets no X-Profile-Id; find it under /admin/profiles.
+    """
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+
+    start, endpoint = g.profiler_start, request.endpoint
+    if response.is_streamed:
+        response.call_on_close(lambda: _save_profile(profiler, start, endpoint))
+        return response
+
+    response.headers['X-Profile-Id'] = _save_profile(profiler, start, endpoint)
+    return response
+
+
+@app.teardown_request
+def discard_profiler(exc):
+    """Disable a profiler that after_request never reached, e.g. when a hook raised"""
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _active_lock.release()
+
+
+def list_profiles():
+    """Saved profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+                stat = entry.stat()
+                profiles.append({
+                    'name': entry.name,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'captured_at': datetime.fromtimestamp(stat.st_mtime),
+                })
+    profiles.sort(key=lambda p: p['mtime'], reverse=True)
+    return profiles
+
+
+def rotate_profiles():
+    """Delete the oldest profiles until the directory fits its count and size limits"""
+    max_files = app.config['PROFILE_MAX_FILES']
+    max_bytes = app.config['PROFILE_MAX_BYTES']
+
+    with _rotate_lock:
+        profiles = list_profiles()
+        total = sum(p['size'] for p in profiles)
+        while profiles and (len(profiles) > max_files or total > max_bytes):
+            oldest = profiles.pop()
+            total -= oldest['size']
+            try:
+                os.remove(os.path.join(profile_dir(), oldest['name']))
+            except FileNotFoundError:
+                pass
+
+
+def profile_summary(name, limit=40):
+    """Top functions by cumulative time as plain text"""
+    output = io.StringIO()
+    stats = pstats.Stats(os.path.join(profile_dir(), name), stream=output)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
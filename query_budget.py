@@ -0,0 +1,337 @@
+"""Query-budget regression check for every route.
+
+Seeds a throwaway SQLite database, requests every route registered by
+routes.py and fails when a request executes more SQL statements or loads
+more ORM rows than its budget allows. Run it in CI with:
+
+    python query_budget.py
+
+A new route without a budget entry also fails the run, so per-row queries
+in templates and unpaginated lists are caught before they ship.
+"""
+import io
+import base64
+import hashlib
+import os
+import sys
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapper
+
+
+SEED_CREW = 120
+SEED_STAFF = 80
+
+# Headroom over the measured counts of the streamed exports and ZIPs, whose
+# bodies are read to the end before counting: one statement and ten rows. A
+# query or lazy load per exported row still fails.
+EXPORT_STATEMENT_MARGIN = 1
+EXPORT_ROW_MARGIN = 10
+
+# Crew and staff rows by the time the exports run: the seed plus one registration each
+EXPORTED_CREW = SEED_CREW + 1
+EXPORTED_STAFF = SEED_STAFF + 1
+
+# endpoint -> (max SQL statements, max ORM rows loaded)
+BUDGETS = {
+    'index': (0, 0),
+    'register_crew': (8, 1),
+    'register_staff': (4, 0),
+    'track_status': (1, 1),
+    'crew_private_profile': (3, 1),
+    'admin_login': (1, 1),
+    'admin_logout': (0, 0),
+    'admin_dashboard': (8, 10),
+    'crew_list': (3, 100),  # Include archived adds one archive page
+    'staff_list': (3, 100),
+    'crew_profile': (2, 1),
+    'staff_profile': (2, 1),
+    'update_crew_status': (3, 1),
+    'update_staff_status': (3, 1),
+    'restore_archived': (6, 2),  # Copy back, change event, tombstone, archive delete, live row reload
+    'export_crew_csv': (1 + EXPORT_STATEMENT_MARGIN, EXPORTED_CREW + EXPORT_ROW_MARGIN),
+    'export_staff_csv': (1 + EXPORT_STATEMENT_MARGIN, EXPORTED_STAFF + EXPORT_ROW_MARGIN),
+    'admin_metrics': (0, 0),
+    'admin_profiles': (0, 0),
+    'admin_profile_detail': (0, 0),
+    'crew_documents_zip': (1 + EXPORT_STATEMENT_MARGIN, 1),
+    'crew_list_documents_zip': (1 + EXPORT_STATEMENT_MARGIN, 50),
+    'export_delta': (4 + EXPORT_STATEMENT_MARGIN, EXPORTED_CREW + EXPORT_ROW_MARGIN),
+    'admin_changes': (2, 100),
+    'admin_changes_stream': (2, 100),
+    'contact_lookup': (2, 2),
+    'admin_analytics': (5, 50),
+    'create_resumable_upload': (4, 1),
+    'resumable_upload': (7, 2),
+    'presign_direct_upload': (1, 1),
+    'confirm_direct_upload': (1, 1),
+    'uploaded_file': (0, 0),
+}
+
+# Endpoints that are not backed by routes.py
+IGNORED_ENDPOINTS = {'static'}
+
+# Direct uploads need object storage; on the local backend they answer with 4xx
+EXPECTED_ERRORS = {'presign_direct_upload', 'confirm_direct_upload'}
+
+
+class QueryCounter:
+    """Count SQL statements and ORM rows while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.statements = 0
+        self.rows = 0
+        event.listen(Engine, 'before_cursor_execute', self._on_statement)
+        event.listen(Mapper, 'load', self._on_load)
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            self.statements += 1
+
+    def _on_load(self, target, context):
+        if self.enabled:
+            self.rows += 1
+
+    def measure(self, func):
+        self.statements = 0
+        self.rows = 0
+        self.enabled = True
+        try:
+            response = func()
+            # Drain streamed bodies so their queries are counted too
+            response.get_data()
+        finally:
+            self.enabled = False
+        return response, self.statements, self.rows
+
+
+def seed(db, models):
+    """Insert a deterministic dataset"""
+    for i in range(SEED_CREW):
+        crew = models.CrewMember(
+            name=f'Seed Crew {i}', rank='AB Seaman', passport=f'P{i:07d}',
+            nationality='Indian', date_of_birth=date(1985, 1, 1) + timedelta(days=i),
+            years_experience=i % 30, availability_date=date(2030, 1, 1),
+            mobile_number=f'+91 90000 {i:05d}', email=f'crew{i}@example.com',
+            status=[0, 1, 2, 3, -1, -2][i % 6],
+        )
+        db.session.add(crew)
+    for i in range(SEED_STAFF):
+        staff = models.StaffMember(
+            full_name=f'Seed Staff {i}', email_or_whatsapp=f'staff{i}@example.com',
+            position_applying='Crewing Executive', department='Crewing',
+            years_experience=i % 20, location='Mumbai', availability_date=date(2030, 1, 1),
+            mobile_number=f'+91 80000 {i:05d}', status=[1, 3, -1][i % 3],
+        )
+        db.session.add(staff)
+    db.session.commit()
+
+    crew = db.session.get(models.CrewMember, 1)
+    crew.generate_profile_token()
+    return crew
+
+
+def archive_rows(db, models):
+    """Archive the last rejected crew and staff rows; returns {entity: id}
+
+    The archived-profile redirects and restore_archived are measured against these.
+    """
+    from archival import archive_batch
+    from upload_gc import Throttle
+
+    now = datetime.utcnow()
+    archived = {}
+    for entity, model in (('crew', models.CrewMember), ('staff', models.StaffMember)):
+        table = model.__table__
+        row_id = db.session.scalar(select(table.c.id).where(table.c.status == -1).order_by(table.c.id.desc()).limit(1))
+        # Backdate past ARCHIVE_REJECTED_MONTHS so the row is eligible
+        db.session.execute(update(table).where(table.c.id == row_id).values(updated_at=now - timedelta(days=3650)))
+        db.session.commit()
+        archive_batch(entity, [row_id], now, Throttle(0))
+        archived[entity] = row_id
+    return archived
+
+
+def build_cases(crew, staff_id, archived, resolve):
+    """Return (endpoint, method, path, data, as_admin[, headers]) for every route
+
+    ``path`` may be a callable for routes whose URL depends on earlier requests.
+    """
+    profile_path = f'/my-profile/{crew.id}-{crew.profile_token}'
+    new_crew = {
+        'name': 'Budget Crew', 'nationality': 'Indian', 'date_of_birth': '1990-01-01',
+        'mobile_number': '+91 99999 00000', 'email': 'budget@example.com', 'rank': 'Cook',
+        'passport': 'BUDGET001', 'years_experience': '5', 'availability_date': '2030-01-01',
+    }
+    new_staff = {
+        'full_name': 'Budget Staff', 'email_or_whatsapp': 'budget.staff@example.com',
+        'mobile_number': '+91 88888 00000', 'location': 'Mumbai', 'position_applying': 'Clerk',
+        'department': 'Ops', 'years_experience': '2', 'availability_date': '2030-01-01',
+    }
+    upload_body = b'%PDF-1.4 resumable budget'
+    upload_headers = {
+        'Upload-Length': str(len(upload_body)),
+        'Upload-Metadata': f"field {base64.b64encode(b'cdc_file').decode()},filename {base64.b64encode(b'cdc.pdf').decode()}",
+    }
+    chunk_headers = {
+        'Upload-Offset': '0', 'Content-Type': 'application/offset+octet-stream',
+        'Upload-Checksum': f'sha1 {base64.b64encode(hashlib.sha1(upload_body).digest()).decode()}',
+    }
+    return [
+        ('index', 'GET', '/', None, False),
+        ('register_crew', 'GET', '/register/crew', None, False),
+        ('register_crew', 'POST', '/register/crew', new_crew, False),
+        ('register_staff', 'GET', '/register/staff', None, False),
+        ('register_staff', 'POST', '/register/staff', new_staff, False),
+        ('track_status', 'GET', f'/track?passport={crew.passport}', None, False),
+        ('crew_private_profile', 'GET', profile_path, None, False),
+        ('crew_private_profile', 'POST', profile_path,
+         lambda: {'passport_file': (io.BytesIO(b'%PDF-1.4 budget'), 'passport.pdf')}, False),
+        ('uploaded_file', 'GET', resolve.uploaded_path, None, False),
+        ('create_resumable_upload', 'OPTIONS', f'{profile_path}/uploads', None, False),
+        ('create_resumable_upload', 'POST', f'{profile_path}/uploads', None, False, upload_headers),
+        ('resumable_upload', 'HEAD', resolve.upload_path, None, False),
+        ('resumable_upload', 'PATCH', resolve.upload_path, upload_body, False, chunk_headers),
+        ('create_resumable_upload', 'POST', f'{profile_path}/uploads', None, False, upload_headers),
+        ('resumable_upload', 'DELETE', resolve.upload_path, None, False),
+        ('presign_direct_upload', 'POST', f'{profile_path}/direct-uploads', None, False, {'Content-Type': 'application/json'}),
+        ('confirm_direct_upload', 'POST', f'{profile_path}/direct-uploads/confirm', None, False,
+         {'Content-Type': 'application/json'}),
+        ('admin_login', 'GET', '/admin/login', None, False),
+        ('admin_login', 'POST', '/admin/login', {'username': 'admin', 'password': 'admin123'}, True),
+        ('admin_dashboard', 'GET', '/admin/dashboard', None, True),
+        ('crew_list', 'GET', '/admin/crew', None, True),
+        ('crew_list', 'GET', '/admin/crew?search=Seed&status=3&page=2', None, True),
+        ('staff_list', 'GET', '/admin/staff', None, True),
+        ('staff_list', 'GET', '/admin/staff?search=Crewing&page=2', None, True),
+        ('crew_list', 'GET', '/admin/crew?search=Seed&archived=include', None, True),
+        ('staff_list', 'GET', '/admin/staff?archived=include', None, True),
+        ('crew_profile', 'GET', f'/admin/crew/{crew.id}', None, True),
+        ('staff_profile', 'GET', f'/admin/staff/{staff_id}', None, True),
+        ('crew_profile', 'GET', f"/admin/crew/{archived['crew']}", None, True),
+        ('staff_profile', 'GET', f"/admin/staff/{archived['staff']}", None, True),
+        ('update_crew_status', 'POST', f'/admin/crew/{crew.id}/update_status',
+         {'action': 'screening', 'notes': 'budget'}, True),
+        ('update_staff_status', 'POST', f'/admin/staff/{staff_id}/update_status',
+         {'action': 'approve', 'notes': 'budget'}, True),
+        ('restore_archived', 'POST', f"/admin/crew/{archived['crew']}/restore", None, True),
+        ('restore_archived', 'POST', f"/admin/staff/{archived['staff']}/restore", None, True),
+        ('crew_documents_zip', 'GET', f'/admin/crew/{crew.id}/documents.zip', None, True),
+        ('crew_list_documents_zip', 'GET', '/admin/crew/documents.zip?status=3', None, True),
+        ('export_crew_csv', 'GET', '/admin/crew/export', None, True),
+        ('export_staff_csv', 'GET', '/admin/staff/export', None, True),
+        ('export_delta', 'GET', '/admin/crew/export/delta', None, True),
+        ('contact_lookup', 'GET', '/admin/lookup?q=%2B91%2090000%2000007', None, True),
+        ('contact_lookup', 'GET', '/admin/lookup?q=Staff7%40Example.com', None, True),
+        ('admin_analytics', 'GET', '/admin/analytics?from=2000-01-01', None, True),
+        ('admin_changes', 'GET', '/admin/api/changes?since=0', None, True),
+        ('admin_changes_stream', 'GET', '/admin/api/changes/stream', None, True),
+        ('export_delta', 'GET', '/admin/staff/export/delta?format=jsonl&since=2000-01-01T00:00:00&after_id=5',
+         None, True),
+        ('admin_metrics', 'GET', '/admin/metrics', None, True),
+        ('admin_dashboard', 'GET', '/admin/dashboard?_profile=1', None, True),
+        ('admin_profiles', 'GET', '/admin/profiles', None, True),
+        ('admin_profile_detail', 'GET', resolve.profile_path, None, True),
+        ('admin_logout', 'GET', '/admin/logout', None, True),
+    ]
+
+
+class PathResolver:
+    """Look up URLs that only exist after earlier requests ran"""
+
+    def __init__(self, app, models, passport):
+        self.app = app
+        self.models = models
+        self.passport = passport
+
+    def uploaded_path(self):
+        with self.app.app_context():
+            crew = self.models.CrewMember.query.filter_by(passport=self.passport).first()
+            return f'/uploads/{crew.passport_file}'
+
+    def upload_path(self):
+        with self.app.app_context():
+            crew = self.models.CrewMember.query.filter_by(passport=self.passport).first()
+            upload = self.models.UploadSession.query.order_by(self.models.UploadSession.created_at.desc()).first()
+            return f'/my-profile/{crew.id}-{crew.profile_token}/uploads/{upload.id}'
+
+    def profile_path(self):
+        from profiling import list_profiles
+        with self.app.app_context():
+            return f"/admin/profiles/{list_profiles()[0]['name']}"
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='maricheck_budget_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'budget.db')}"
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    from app import app, db
+    import models
+    from analytics import refresh_rollups
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    app.config['ARCHIVE_UPLOAD_FOLDER'] = os.path.join(workdir, 'archive_uploads')
+    app.config['ADMIN_LIST_PAGE_SIZE'] = 50
+    app.config['PROFILE_DIR'] = os.path.join(workdir, 'profiles')
+    app.config['UPLOAD_STAGING_FOLDER'] = os.path.join(workdir, 'upload_staging')
+    app.config['PROFILE_SAMPLE_RATE'] = 0
+    app.config['CHANGE_STREAM_MAX_SECONDS'] = 0  # One poll, then the stream closes
+    app.config['INVALIDATION_BUS'] = 'local'  # No listener thread per measured process
+
+    failures = []
+    exercised = set()
+    counter = QueryCounter()
+
+    try:
+        with app.app_context():
+            crew = seed(db, models)
+            refresh_rollups()
+            cases = build_cases(crew, staff_id=1, archived=archive_rows(db, models), resolve=PathResolver(app, models, crew.passport))
+
+        admin_client = app.test_client()
+        public_client = app.test_client()
+
+        for endpoint, method, path, data, as_admin, *headers in cases:
+            client = admin_client if as_admin else public_client
+            if callable(path):
+                path = path()
+            if callable(data):
+                data = data()
+
+            response, statements, rows = counter.measure(
+                lambda: client.open(path, method=method, data=data, headers=dict(*headers)))
+            exercised.add(endpoint)
+
+            max_statements, max_rows = BUDGETS[endpoint]
+            status = 'ok'
+            if response.status_code >= 400 and endpoint not in EXPECTED_ERRORS:
+                status = f'HTTP {response.status_code}'
+            elif statements > max_statements or rows > max_rows:
+                status = 'OVER BUDGET'
+            if status != 'ok':
+                failures.append(endpoint)
+            print(f'{status:12} {method:4} {path:60} statements={statements}/{max_statements} rows={rows}/{max_rows}')
+
+        routed = {rule.endpoint for rule in app.url_map.iter_rules()} - IGNORED_ENDPOINTS
+        for endpoint in sorted(routed - exercised):
+            failures.append(endpoint)
+            print(f'{"NO BUDGET":12} {endpoint} is routed but not exercised')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print(f'\n{len(failures)} route check(s) failed')
+        return 1
+    print('\nAll routes within budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
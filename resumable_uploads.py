@@ -0,0 +1,262 @@
+"""Resumable, chunked document uploads in the style of the tus protocol.
+
+A client creates an upload with its total length, then PATCHes chunks at the
+current offset, optionally with an ``Upload-Checksum`` per chunk. After a
+dropped connection it asks for the offset with HEAD and continues from there.
+Chunks are spooled to a temporary file before any database lock is taken, so
+a slow link costs one short request per chunk instead of a worker held for
+the whole file. Completed uploads go through save_uploaded_file() and are
+committed to the crew member's ``*_file`` column.
+"""
+import os
+import base64
+import hashlib
+import secrets
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask_wtf.file import FileAllowed
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.utils import secure_filename
+
+from app import app, db
+from forms import CrewProfileDocumentForm
+from models import UploadSession
+from utils import save_uploaded_file
+
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,termination,checksum,expiration'
+CHECKSUM_ALGORITHMS = {'sha1', 'sha256', 'md5'}
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Protocol error carrying the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def allowed_extensions(field):
+    """Extensions accepted for a document field, or None if it is not one"""
+    unbound = getattr(CrewProfileDocumentForm, field, None)
+    if not field.endswith('_file') or unbound is None:
+        return None
+    for validator in unbound.kwargs.get('validators', []):
+        if isinstance(validator, FileAllowed):
+            return {ext.lower() for ext in validator.upload_set}
+    return None
+
+
+def parse_metadata(header):
+    """Decode a tus Upload-Metadata header into a dict"""
+    metadata = {}
+    for pair in filter(None, (part.strip() for part in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+        except ValueError:
+            raise UploadError(400, 'Malformed Upload-Metadata')
+    return metadata
+
+
+def parse_checksum(header):
+    """Split an Upload-Checksum header into (algorithm, digest bytes)"""
+    if not header:
+        return None
+    algorithm, _, encoded = header.partition(' ')
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(400, 'Unsupported checksum algorithm')
+    try:
+        return algorithm, base64.b64decode(encoded, validate=True)
+    except ValueError:
+        raise UploadError(400, 'Malformed Upload-Checksum')
+
+
+def staging_path(upload_id):
+    return os.path.join(current_app.config['UPLOAD_STAGING_FOLDER'], f'{upload_id}.part')
+
+
+def _expiry():
+    return datetime.utcnow() + timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+
+
+def create_upload(crew_member, length_header, metadata_header):
+    """Start an upload session; returns the new UploadSession"""
+    try:
+        length = int(length_header)
+    except (TypeError, ValueError):
+        raise UploadError(400, 'Upload-Length is required')
+    if length <= 0:
+        raise UploadError(400, 'Upload-Length must be positive')
+    if length > current_app.config['MAX_CONTENT_LENGTH']:
+        raise UploadError(413, 'File is too large')
+
+    metadata = parse_metadata(metadata_header)
+    field = metadata.get('field', '')
+    filename = secure_filename(metadata.get('filename', ''))
+    extensions = allowed_extensions(field)
+    if extensions is None:
+        raise UploadError(400, 'Unknown document field')
+    if not filename or os.path.splitext(filename)[1].lower().lstrip('.') not in extensions:
+        raise UploadError(415, 'File type not allowed for this document')
+
+    purge_expired_uploads()
+
+    upload = UploadSession(id=secrets.token_hex(16), crew_member_id=crew_member.id, field=field,
+                           filename=filename, length=length, offset=0, expires_at=_expiry())
+    os.makedirs(current_app.config['UPLOAD_STAGING_FOLDER'], exist_ok=True)
+    open(staging_path(upload.id), 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def get_upload(crew_member, upload_id, lock=False):
+    """Live upload session belonging to crew_member"""
+    query = UploadSession.query.filter_by(id=upload_id, crew_member_id=crew_member.id)
+    if lock:
+        query = query.with_for_update()
+    upload = query.first()
+    if upload is None:
+        raise UploadError(404, 'Unknown upload')
+    if upload.expires_at < datetime.utcnow():
+        discard_upload(upload)
+        raise UploadError(410, 'Upload expired')
+    return upload
+
+
+def _spool_chunk(stream, checksum, limit):
+    """Copy the request body to a temporary file, verifying size and checksum"""
+    spool = tempfile.SpooledTemporaryFile(max_size=current_app.config['UPLOAD_CHUNK_SIZE'])
+    digest = hashlib.new(checksum[0]) if checksum else None
+    size = 0
+    try:
+        for block in iter(lambda: stream.read(READ_SIZE), b''):
+            size += len(block)
+            if size > limit:
+                raise UploadError(413, 'Chunk runs past Upload-Length')
+            if digest:
+                digest.update(block)
+            spool.write(block)
+    except ClientDisconnected:
+        # Without a checksum the bytes that did arrive are still usable
+        if checksum:
+            spool.close()
+            raise UploadError(400, 'Connection dropped mid-chunk')
+    except UploadError:
+        spool.close()
+        raise
+
+    if digest and digest.digest() != checksum[1]:
+        spool.close()
+        raise UploadError(460, 'Checksum mismatch')
+    spool.seek(0)
+    return spool, size
+
+
+def append_chunk(crew_member, upload_id, offset_header, checksum_header, stream):
+    """Append one chunk at the client's offset; returns the new offset
+
+    The body is read before the session row is locked, so only the final
+    append and offset update happen inside the short locking transaction.
+    """
+    try:
+        offset = int(offset_header)
+    except (TypeError, ValueError):
+        raise UploadError(400, 'Upload-Offset is required')
+    checksum = parse_checksum(checksum_header)
+
+    upload = get_upload(crew_member, upload_id)
+    if offset != upload.offset:
+        raise UploadError(409, 'Upload-Offset does not match')
+    remaining = upload.length - upload.offset
+    db.session.rollback()  # Hold no transaction while the chunk arrives
+
+    spool, size = _spool_chunk(stream, checksum, remaining)
+    with spool:
+        upload = get_upload(crew_member, upload_id, lock=True)
+        if offset != upload.offset:
+            db.session.rollback()
+            raise UploadError(409, 'Upload-Offset does not match')
+        with open(staging_path(upload.id), 'r+b') as staging:
+            staging.truncate(offset)  # Drop any partial write from a failed attempt
+            staging.seek(offset)
+            shutil.copyfileobj(spool, staging, READ_SIZE)
+        upload.offset = offset + size
+        upload.expires_at = _expiry()
+
+        if upload.offset == upload.length:
+            _complete(crew_member, upload)
+        db.session.commit()
+    return offset + size
+
+
+def _complete(crew_member, upload):
+    """Store the assembled file and point the document column at it"""
+    path = staging_path(upload.id)
+    with open(path, 'rb') as staged:
+        filename = save_uploaded_file(FileStorage(stream=staged, filename=upload.filename), 'crew')
+    setattr(crew_member, upload.field, filename)
+    crew_member.updated_at = datetime.utcnow()
+    db.session.delete(upload)
+    os.remove(path)
+
+
+def discard_upload(upload):
+    """Delete an upload session and its staging file"""
+    try:
+        os.remove(staging_path(upload.id))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+    db.session.commit()
+
+
+def purge_expired_uploads(limit=100):
+    """Discard up to limit abandoned upload sessions; returns the number removed"""
+    expired = (UploadSession.query.filter(UploadSession.expires_at < datetime.utcnow())
+               .order_by(UploadSession.expires_at).limit(limit).all())
+    for upload in expired:
+        discard_upload(upload)
+    return len(expired)
+
+
+def tus_headers(upload=None):
+    """Protocol headers for a response, describing upload when given"""
+    headers = {'Tus-Resumable': TUS_VERSION, 'Cache-Control': 'no-store'}
+    if upload is not None:
+        headers['Upload-Offset'] = str(upload.offset)
+        headers['Upload-Length'] = str(upload.length)
+        headers['Upload-Expires'] = upload.expires_at.strftime('%a, %d %b %Y %H:%M:%S GMT')
+    return headers
+
+
+def capability_headers():
+    """Headers answering an OPTIONS discovery request"""
+    return {
+        **tus_headers(),
+        'Tus-Version': TUS_VERSION,
+        'Tus-Extension': TUS_EXTENSIONS,
+        'Tus-Max-Size': str(current_app.config['MAX_CONTENT_LENGTH']),
+        'Tus-Checksum-Algorithm': ','.join(sorted(CHECKSUM_ALGORITHMS)),
+        'Upload-Chunk-Size': str(current_app.config['UPLOAD_CHUNK_SIZE']),
+    }
+
+
+@app.cli.command('purge-uploads')
+def purge_uploads():
+    """Remove expired resumable upload sessions and their staging files."""
+    removed = 0
+    while True:
+        batch = purge_expired_uploads()
+        removed += batch
+        if not batch:
+            break
+    click.echo(f'Removed {removed} expired upload(s)')
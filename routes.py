@@ -1,16 +1,67 @@
 import os
-import csv
-from io import StringIO
-from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, session, make_response, send_from_directory
+import hmac
+from datetime import date, datetime, timedelta
+from flask import render_template, request, redirect, url_for, flash, session, make_response, send_from_directory, abort, Response, stream_with_context, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
 
 from app import app, db
-from models import Admin, CrewMember, StaffMember
+from models import Admin, ArchivedCrewMember, ArchivedStaffMember, CrewMember, StaffMember
 from forms import CrewRegistrationForm, StaffRegistrationForm, TrackingForm, AdminLoginForm, CrewProfileDocumentForm
-from utils import save_uploaded_file
+from utils import iter_csv
+from upload_batch import UploadBatch
+from delta_export import parse_watermark, rewind, upper_bound, iter_changes, iter_delta_csv, iter_delta_jsonl
+from change_feed import changes_since, iter_event_stream, latest_cursor, serialize
+from duplicates import find_duplicates, describe_duplicates
+from contacts import lookup_contact
+from analytics import analytics_report
+from archival import ArchiveError, restore_record
+from resumable_uploads import (UploadError, create_upload, get_upload, append_chunk, discard_upload,
+                               tus_headers, capability_headers)
+from storage import get_storage
+from upload_layout import resolve_key
+from direct_uploads import presign_upload, confirm_upload
+from zip_stream import iter_zip, crew_document_entries
+from db_routing import read_only
+from metrics import render_metrics
+from admin_identity import AdminIdentity, identity_cache
+from login_throttle import login_throttle
+from profiling import PROFILE_SUFFIX, list_profiles, profile_dir, profile_summary
+
+
+# Document fields accepted at registration and on the private profile page
+CREW_REGISTRATION_FILES = ['passport_file', 'cdc_file', 'resume_file', 'photo_file', 'medical_certificate_file']
+CREW_PROFILE_FILES = [
+    'passport_file', 'cdc_file', 'resume_file', 'photo_file', 'medical_certificate_file',
+    'coc_cop_file', 'stcw_certificates_file', 'gmdss_dce_file', 'yellow_fever_file',
+    'bank_details_file', 'aadhaar_pan_file', 'indos_certificate_file', 'experience_letters_file', 'other_document_file'
+]
+
+
+def crew_member_from_form(form):
+    """Unsaved CrewMember from a validated registration form"""
+    return CrewMember(
+        name=form.name.data,
+        nationality=form.nationality.data,
+        date_of_birth=form.date_of_birth.data,
+        mobile_number=form.mobile_number.data,
+        email=form.email.data,
+        rank=form.rank.data,
+        passport=form.passport.data.upper() if form.passport.data else '',
+        years_experience=form.years_experience.data,
+        last_vessel_type=form.last_vessel_type.data,
+        next_available_port=form.next_available_port.data,
+        availability_date=form.availability_date.data,
+        emergency_contact_name=form.emergency_contact_name.data,
+        emergency_contact_phone=form.emergency_contact_phone.data,
+        emergency_contact_relationship=form.emergency_contact_relationship.data
+    )
+
+
+def document_label(field_name):
+    """'medical_certificate_file' -> 'Medical Certificate'"""
+    return field_name.replace('_file', '').replace('_', ' ').title()
 
 
 @app.route('/')
@@ -32,33 +83,21 @@ def register_crew():
             return render_template('register_crew.html', form=form)
         
         # Create new crew member
-        crew_member = CrewMember(
-            name=form.name.data,
-            nationality=form.nationality.data,
-            date_of_birth=form.date_of_birth.data,
-            mobile_number=form.mobile_number.data,
-            email=form.email.data,
-            rank=form.rank.data,
-            passport=form.passport.data.upper() if form.passport.data else '',
-            years_experience=form.years_experience.data,
-            last_vessel_type=form.last_vessel_type.data,
-            next_available_port=form.next_available_port.data,
-            availability_date=form.availability_date.data,
-            emergency_contact_name=form.emergency_contact_name.data,
-            emergency_contact_phone=form.emergency_contact_phone.data,
-            emergency_contact_relationship=form.emergency_contact_relationship.data
-        )
+        crew_member = crew_member_from_form(form)
+        
+        duplicates = find_duplicates(crew_member)
+        if duplicates:
+            crew_member.screening_notes = describe_duplicates(duplicates)
+            app.logger.info('Crew registration %s flagged as a likely duplicate', crew_member.passport)
         
         # Handle file uploads - Core documents only for registration
-        file_fields = ['passport_file', 'cdc_file', 'resume_file', 'photo_file', 'medical_certificate_file']
-        for field_name in file_fields:
-            file_field = getattr(form, field_name)
-            if file_field.data:
-                filename = save_uploaded_file(file_field.data, 'crew')
+        uploads = {name: getattr(form, name).data for name in CREW_REGISTRATION_FILES if getattr(form, name).data}
+        with UploadBatch('crew') as batch:
+            for field_name, filename in batch.save(uploads).items():
                 setattr(crew_member, field_name, filename)
-        
-        db.session.add(crew_member)
-        db.session.commit()
+            
+            db.session.add(crew_member)
+            db.session.commit()
         
         # Generate profile token for secure access
         crew_member.generate_profile_token()
@@ -91,16 +130,20 @@ def register_staff():
             salary_expectation=form.salary_expectation.data
         )
         
+        duplicates = find_duplicates(staff_member)
+        if duplicates:
+            staff_member.screening_notes = describe_duplicates(duplicates)
+            app.logger.info('Staff registration flagged as a likely duplicate')
+        
         # Handle file uploads
         file_fields = ['resume_file', 'photo_file']
-        for field_name in file_fields:
-            file_field = getattr(form, field_name)
-            if file_field.data:
-                filename = save_uploaded_file(file_field.data, 'staff')
+        uploads = {name: getattr(form, name).data for name in file_fields if getattr(form, name).data}
+        with UploadBatch('staff') as batch:
+            for field_name, filename in batch.save(uploads).items():
                 setattr(staff_member, field_name, filename)
-        
-        db.session.add(staff_member)
-        db.session.commit()
+            
+            db.session.add(staff_member)
+            db.session.commit()
         
         flash('Registration successful! Your application has been submitted.', 'success')
         return redirect(url_for('index'))
@@ -109,6 +152,7 @@ def register_staff():
 
 
 @app.route('/track', methods=['GET', 'POST'])
+@read_only
 def track_status():
     """Track application status"""
     form = TrackingForm()
@@ -144,23 +188,16 @@ def crew_private_profile(crew_id, token):
     if request.method == 'POST' and document_form.validate_on_submit():
         updated_docs = []
         
-        # Handle all document fields
-        document_fields = [
-            'passport_file', 'cdc_file', 'resume_file', 'photo_file', 'medical_certificate_file',
-            'coc_cop_file', 'stcw_certificates_file', 'gmdss_dce_file', 'yellow_fever_file',
-            'bank_details_file', 'aadhaar_pan_file', 'indos_certificate_file', 'experience_letters_file', 'other_document_file'
-        ]
-        
-        for field_name in document_fields:
-            file_field = getattr(document_form, field_name)
-            if file_field.data:
-                filename = save_uploaded_file(file_field.data, 'crew')
-                setattr(crew_member, field_name, filename)
-                updated_docs.append(field_name.replace('_file', '').replace('_', ' ').title())
-        
-        if updated_docs:
-            crew_member.updated_at = datetime.utcnow()
-            db.session.commit()
+        uploads = {name: getattr(document_form, name).data
+                   for name in CREW_PROFILE_FILES if getattr(document_form, name).data}
+        if uploads:
+            # Files are written concurrently; the columns change in one commit or not at all
+            with UploadBatch('crew') as batch:
+                for field_name, filename in batch.save(uploads).items():
+                    setattr(crew_member, field_name, filename)
+                    updated_docs.append(document_label(field_name))
+                crew_member.updated_at = datetime.utcnow()
+                db.session.commit()
             flash(f'Successfully uploaded: {", ".join(updated_docs)}', 'success')
         else:
             flash('No files were selected for upload.', 'warning')
@@ -169,7 +206,86 @@ def crew_private_profile(crew_id, token):
     
     return render_template('crew_private_profile.html', 
                          crew_member=crew_member, 
-                         document_form=document_form)
+                         document_form=document_form,
+                         direct_uploads=get_storage().supports_presigned_urls)
+
+
+def _profile_owner(crew_id, token):
+    """Crew member whose private profile token matches, or 404"""
+    crew_member = CrewMember.query.get_or_404(crew_id)
+    if not crew_member.profile_token or not hmac.compare_digest(crew_member.profile_token, token):
+        abort(404)
+    return crew_member
+
+
+def _upload_error(error):
+    response = make_response(str(error), error.status)
+    response.headers.update(tus_headers())
+    return response
+
+
+@app.route('/my-profile/<int:crew_id>-<token>/uploads', methods=['POST', 'OPTIONS'])
+def create_resumable_upload(crew_id, token):
+    """Start a resumable document upload (tus creation)"""
+    if request.method == 'OPTIONS':
+        return '', 204, capability_headers()
+    
+    crew_member = _profile_owner(crew_id, token)
+    try:
+        upload = create_upload(crew_member, request.headers.get('Upload-Length'),
+                               request.headers.get('Upload-Metadata'))
+    except UploadError as error:
+        return _upload_error(error)
+    
+    headers = tus_headers(upload)
+    headers['Location'] = url_for('resumable_upload', crew_id=crew_id, token=token, upload_id=upload.id)
+    return '', 201, headers
+
+
+@app.route('/my-profile/<int:crew_id>-<token>/uploads/<upload_id>', methods=['HEAD', 'PATCH', 'DELETE'])
+def resumable_upload(crew_id, token, upload_id):
+    """Report the offset of, append a chunk to, or cancel a resumable upload"""
+    crew_member = _profile_owner(crew_id, token)
+    try:
+        if request.method == 'PATCH':
+            if request.mimetype != 'application/offset+octet-stream':
+                raise UploadError(415, 'Chunks must be sent as application/offset+octet-stream')
+            offset = append_chunk(crew_member, upload_id, request.headers.get('Upload-Offset'),
+                                  request.headers.get('Upload-Checksum'), request.stream)
+            headers = tus_headers()
+            headers['Upload-Offset'] = str(offset)
+            return '', 204, headers
+        
+        upload = get_upload(crew_member, upload_id)
+        if request.method == 'DELETE':
+            discard_upload(upload)
+            return '', 204, tus_headers()
+        return '', 200, tus_headers(upload)
+    except UploadError as error:
+        return _upload_error(error)
+
+
+@app.route('/my-profile/<int:crew_id>-<token>/direct-uploads', methods=['POST'])
+def presign_direct_upload(crew_id, token):
+    """Issue a presigned POST so a document goes straight to object storage"""
+    crew_member = _profile_owner(crew_id, token)
+    payload = request.get_json(silent=True) or {}
+    try:
+        return jsonify(presign_upload(crew_member, payload.get('field'), payload.get('filename'),
+                                      payload.get('size')))
+    except UploadError as error:
+        return jsonify({'error': str(error)}), error.status
+
+
+@app.route('/my-profile/<int:crew_id>-<token>/direct-uploads/confirm', methods=['POST'])
+def confirm_direct_upload(crew_id, token):
+    """Attach a document that was uploaded straight to object storage"""
+    crew_member = _profile_owner(crew_id, token)
+    payload = request.get_json(silent=True) or {}
+    try:
+        return jsonify({'field': confirm_upload(crew_member, payload.get('token'))})
+    except UploadError as error:
+        return jsonify({'error': str(error)}), error.status
 
 
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -181,9 +297,18 @@ def admin_login():
     form = AdminLoginForm()
     
     if form.validate_on_submit():
+        # Refuse throttled attempts before paying for a password hash
+        retry_after = login_throttle.hit(request.remote_addr, form.username.data)
+        if retry_after:
+            flash('Too many login attempts. Please wait a moment and try again.', 'error')
+            response = make_response(render_template('admin/login.html', form=form), 429)
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response
+        
         admin = Admin.query.filter_by(username=form.username.data).first()
         if admin and admin.password_hash and check_password_hash(admin.password_hash, form.password.data):
             login_user(admin)
+            identity_cache.put(AdminIdentity.from_admin(admin))
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('admin_dashboard'))
         else:
@@ -196,6 +321,7 @@ def admin_login():
 @login_required
 def admin_logout():
     """Admin logout"""
+    identity_cache.invalidate(current_user.id)
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('index'))
@@ -203,6 +329,7 @@ def admin_logout():
 
 @app.route('/admin/dashboard')
 @login_required
+@read_only
 def admin_dashboard():
     """Admin dashboard"""
     # Get statistics
@@ -228,72 +355,208 @@ def admin_dashboard():
                          recent_staff=recent_staff)
 
 
-@app.route('/admin/crew')
-@login_required
-def crew_list():
-    """Crew member list"""
-    status_filter = request.args.get('status')
-    search = request.args.get('search', '')
+def filtered_crew_query(status_filter, search, model=CrewMember):
+    """Crew query with the admin list's status and search filters applied"""
+    query = model.query
+    
+    if status_filter:
+        query = query.filter(model.status == int(status_filter))
+    
+    if search:
+        query = query.filter(
+            db.or_(
+                model.name.ilike(f'%{search}%'),
+                model.passport.ilike(f'%{search}%'),
+                model.rank.ilike(f'%{search}%')
+            )
+        )
     
-    query = CrewMember.query
+    return query
+
+
+def filtered_staff_query(status_filter, search, model=StaffMember):
+    """Staff query with the admin list's status and search filters applied"""
+    query = model.query
     
     if status_filter:
-        query = query.filter(CrewMember.status == int(status_filter))
+        query = query.filter(model.status == int(status_filter))
     
     if search:
         query = query.filter(
             db.or_(
-                CrewMember.name.ilike(f'%{search}%'),
-                CrewMember.passport.ilike(f'%{search}%'),
-                CrewMember.rank.ilike(f'%{search}%')
+                model.full_name.ilike(f'%{search}%'),
+                model.position_applying.ilike(f'%{search}%'),
+                model.department.ilike(f'%{search}%')
             )
         )
     
-    crew_members = query.order_by(CrewMember.created_at.desc()).all()
+    return query
+
+
+def archived_matches(query, model):
+    """Newest archived rows for the lists' "Include archived" mode"""
+    return query.order_by(model.created_at.desc()).limit(app.config['ADMIN_LIST_PAGE_SIZE']).all()
+
+
+@app.route('/admin/crew')
+@login_required
+@read_only
+def crew_list():
+    """Crew member list"""
+    status_filter = request.args.get('status')
+    search = request.args.get('search', '')
+    include_archived = request.args.get('archived') == 'include'
+    
+    query = filtered_crew_query(status_filter, search)
     
-    return render_template('admin/crew_list.html', crew_members=crew_members, search=search, status_filter=status_filter)
+    page = request.args.get('page', 1, type=int)
+    pagination = query.order_by(CrewMember.created_at.desc()).paginate(
+        page=page, per_page=app.config['ADMIN_LIST_PAGE_SIZE'], error_out=False)
+    archived = None
+    if include_archived:
+        archived = archived_matches(filtered_crew_query(status_filter, search, ArchivedCrewMember),
+                                    ArchivedCrewMember)
+    
+    return render_template('admin/crew_list.html', crew_members=pagination.items, pagination=pagination,
+                         search=search, status_filter=status_filter, include_archived=include_archived,
+                         archived_members=archived)
 
 
 @app.route('/admin/staff')
 @login_required
+@read_only
 def staff_list():
     """Staff member list"""
     status_filter = request.args.get('status')
     search = request.args.get('search', '')
+    include_archived = request.args.get('archived') == 'include'
     
-    query = StaffMember.query
-    
-    if status_filter:
-        query = query.filter(StaffMember.status == int(status_filter))
-    
-    if search:
-        query = query.filter(
-            db.or_(
-                StaffMember.full_name.ilike(f'%{search}%'),
-                StaffMember.position_applying.ilike(f'%{search}%'),
-                StaffMember.department.ilike(f'%{search}%')
-            )
-        )
+    query = filtered_staff_query(status_filter, search)
     
-    staff_members = query.order_by(StaffMember.created_at.desc()).all()
+    page = request.args.get('page', 1, type=int)
+    pagination = query.order_by(StaffMember.created_at.desc()).paginate(
+        page=page, per_page=app.config['ADMIN_LIST_PAGE_SIZE'], error_out=False)
+    archived = None
+    if include_archived:
+        archived = archived_matches(filtered_staff_query(status_filter, search, ArchivedStaffMember),
+                                    ArchivedStaffMember)
     
-    return render_template('admin/staff_list.html', staff_members=staff_members, search=search, status_filter=status_filter)
+    return render_template('admin/staff_list.html', staff_members=pagination.items, pagination=pagination,
+                         search=search, status_filter=status_filter, include_archived=include_archived,
+                         archived_members=archived)
+
+
+@app.route('/admin/lookup')
+@login_required
+@read_only
+def contact_lookup():
+    """Find applicants by email, mobile or WhatsApp number using the normalized columns"""
+    query = request.args.get('q', '').strip()
+    crew_members, staff_members = lookup_contact(query) if query else ([], [])
+    return render_template('admin/lookup.html', query=query,
+                           crew_members=crew_members, staff_members=staff_members)
+
+
+@app.route('/admin/analytics')
+@login_required
+@read_only
+def admin_analytics():
+    """Registration and approval analytics, read from the daily rollups"""
+    entity = request.args.get('entity', 'crew')
+    if entity not in ('crew', 'staff'):
+        abort(404)
+    
+    try:
+        end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        start = date.fromisoformat(request.args['from']) if request.args.get('from') else end - timedelta(days=89)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'error')
+        return redirect(url_for('admin_analytics', entity=entity))
+    if start > end:
+        start, end = end, start
+    
+    return render_template('admin/analytics.html', entity=entity, start=start, end=end,
+                           report=analytics_report(entity, start, end))
 
 
 @app.route('/admin/crew/<int:crew_id>')
 @login_required
+@read_only
 def crew_profile(crew_id):
     """Crew member profile"""
+    crew_member = db.session.get(CrewMember, crew_id)
+    if crew_member is None:
+        archived = ArchivedCrewMember.query.get_or_404(crew_id)
+        flash('This crew member has been archived. Restore the record to open the profile.', 'info')
+        return redirect(url_for('crew_list', archived='include', search=archived.passport))
+    return render_template('admin/crew_profile.html', crew_member=crew_member,
+                           duplicates=find_duplicates(crew_member))
+
+
+@app.route('/admin/crew/<int:crew_id>/documents.zip')
+@login_required
+@read_only
+def crew_documents_zip(crew_id):
+    """Download all of a crew member's documents as one ZIP"""
     crew_member = CrewMember.query.get_or_404(crew_id)
-    return render_template('admin/crew_profile.html', crew_member=crew_member)
+    entries = list(crew_document_entries(crew_member))
+    
+    response = Response(stream_with_context(iter_zip(entries)), mimetype='application/zip')
+    filename = secure_filename(f'{crew_member.name}_{crew_member.passport}_documents.zip')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+@app.route('/admin/crew/documents.zip')
+@login_required
+@read_only
+def crew_list_documents_zip():
+    """Download the documents of every crew member matching the list filters"""
+    status_filter = request.args.get('status')
+    search = request.args.get('search', '')
+    
+    query = filtered_crew_query(status_filter, search)
+    ids = request.args.get('ids')
+    if ids:
+        query = query.filter(CrewMember.id.in_([int(i) for i in ids.split(',') if i.isdigit()]))
+    crew_members = query.order_by(CrewMember.created_at.desc()).yield_per(500)
+    
+    def entries():
+        for crew in crew_members:
+            folder = secure_filename(f'{crew.name}_{crew.passport}') + '/'
+            yield from crew_document_entries(crew, folder)
+    
+    response = Response(stream_with_context(iter_zip(entries())), mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename=crew_documents_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    return response
 
 
 @app.route('/admin/staff/<int:staff_id>')
 @login_required
+@read_only
 def staff_profile(staff_id):
     """Staff member profile"""
-    staff_member = StaffMember.query.get_or_404(staff_id)
-    return render_template('admin/staff_profile.html', staff_member=staff_member)
+    staff_member = db.session.get(StaffMember, staff_id)
+    if staff_member is None:
+        archived = ArchivedStaffMember.query.get_or_404(staff_id)
+        flash('This staff member has been archived. Restore the record to open the profile.', 'info')
+        return redirect(url_for('staff_list', archived='include', search=archived.full_name))
+    return render_template('admin/staff_profile.html', staff_member=staff_member,
+                           duplicates=find_duplicates(staff_member))
+
+
+@app.route('/admin/<any(crew, staff):entity>/<int:record_id>/restore', methods=['POST'])
+@login_required
+def restore_archived(entity, record_id):
+    """Move an archived record and its documents back to the live tables"""
+    try:
+        restore_record(entity, record_id)
+    except ArchiveError as e:
+        flash(str(e), 'error')
+        return redirect(url_for(f'{entity}_list', archived='include'))
+    
+    flash('Record restored from the archive.', 'success')
+    return redirect(url_for(f'{entity}_profile', **{f'{entity}_id': record_id}))
 
 
 @app.route('/admin/crew/<int:crew_id>/update_status', methods=['POST'])
@@ -356,31 +619,23 @@ def update_staff_status(staff_id):
 
 @app.route('/admin/crew/export')
 @login_required
+@read_only
 def export_crew_csv():
     """Export crew data to CSV"""
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # CSV Headers
-    writer.writerow([
+    header = [
         'ID', 'Name', 'Rank', 'Passport', 'Nationality', 'Date of Birth',
         'Years Experience', 'Mobile Number', 'Email', 'Status', 'Created At'
-    ])
-    
-    # Get all crew members
-    crew_members = CrewMember.query.order_by(CrewMember.created_at.desc()).all()
-    
-    for crew in crew_members:
-        writer.writerow([
-            crew.id, crew.name, crew.rank, crew.passport, crew.nationality,
-            crew.date_of_birth, crew.years_experience, crew.mobile_number,
-            crew.email, crew.get_status_name(), crew.created_at
-        ])
-    
-    # Prepare response
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
+    ]
+    
+    # Stream all crew members in batches instead of building the file in memory
+    crew_members = CrewMember.query.order_by(CrewMember.created_at.desc()).yield_per(1000)
+    rows = ([
+        crew.id, crew.name, crew.rank, crew.passport, crew.nationality,
+        crew.date_of_birth, crew.years_experience, crew.mobile_number,
+        crew.email, crew.get_status_name(), crew.created_at
+    ] for crew in crew_members)
+    
+    response = Response(stream_with_context(iter_csv(header, rows)), mimetype='text/csv')
     response.headers['Content-Disposition'] = f'attachment; filename=crew_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
     return response
@@ -388,37 +643,155 @@ def export_crew_csv():
 
 @app.route('/admin/staff/export')
 @login_required
+@read_only
 def export_staff_csv():
     """Export staff data to CSV"""
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # CSV Headers
-    writer.writerow([
+    header = [
         'ID', 'Full Name', 'Position Applying', 'Department', 'Years Experience',
         'Location', 'Mobile Number', 'Email/WhatsApp', 'Status', 'Created At'
-    ])
-    
-    # Get all staff members
-    staff_members = StaffMember.query.order_by(StaffMember.created_at.desc()).all()
-    
-    for staff in staff_members:
-        writer.writerow([
-            staff.id, staff.full_name, staff.position_applying, staff.department,
-            staff.years_experience, staff.location, staff.mobile_number,
-            staff.email_or_whatsapp, staff.get_status_name(), staff.created_at
-        ])
-    
-    # Prepare response
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
+    ]
+    
+    # Stream all staff members in batches instead of building the file in memory
+    staff_members = StaffMember.query.order_by(StaffMember.created_at.desc()).yield_per(1000)
+    rows = ([
+        staff.id, staff.full_name, staff.position_applying, staff.department,
+        staff.years_experience, staff.location, staff.mobile_number,
+        staff.email_or_whatsapp, staff.get_status_name(), staff.created_at
+    ] for staff in staff_members)
+    
+    response = Response(stream_with_context(iter_csv(header, rows)), mimetype='text/csv')
     response.headers['Content-Disposition'] = f'attachment; filename=staff_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
     return response
 
 
+def has_bearer_token(config_key):
+    """Check the Authorization header against a token from the app config"""
+    token = app.config.get(config_key)
+    auth_header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(auth_header, f'Bearer {token}')
+
+
+@app.route('/admin/<any(crew, staff):entity>/export/delta')
+@read_only
+def export_delta(entity):
+    """Export rows changed since an (updated_at, id) watermark, including deletions
+
+    The overlap window before the watermark is always re-sent, so consumers
+    must upsert by ID.
+    """
+    if not current_user.is_authenticated and not has_bearer_token('EXPORT_TOKEN'):
+        return app.login_manager.unauthorized()
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        abort(400)
+    try:
+        watermark = parse_watermark(request.args.get('since'), request.args.get('after_id'))
+    except ValueError:
+        abort(400)
+    
+    # Fix the upper bound first so the returned watermark matches the rows sent
+    bound = upper_bound(entity)
+    if watermark and (bound is None or bound < watermark):
+        bound = watermark
+    # Rows just behind the watermark are sent again in case they committed after the last export
+    changes = iter_changes(entity, rewind(watermark), bound)
+    
+    if export_format == 'jsonl':
+        body, mimetype = iter_delta_jsonl(changes), 'application/x-ndjson'
+    else:
+        body, mimetype = iter_delta_csv(entity, changes), 'text/csv'
+    
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    next_watermark = bound or watermark
+    if next_watermark:
+        response.headers['X-Watermark-Since'] = next_watermark[0].isoformat()
+        response.headers['X-Watermark-After-Id'] = str(next_watermark[1])
+    response.headers['Content-Disposition'] = f'attachment; filename={entity}_delta_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+    return response
+
+
+@app.route('/admin/api/changes')
+@login_required
+@read_only
+def admin_changes():
+    """Page through the change feed after an event id cursor
+
+    Without since, only the current cursor is returned for pollers to start
+    from. Recent events behind the cursor are included again because they may
+    have committed late; clients skip the ids they already have.
+    """
+    since = request.args.get('since', type=int)
+    if since is None:
+        return jsonify({'changes': [], 'next': latest_cursor(), 'has_more': False})
+    limit = min(request.args.get('limit', app.config['CHANGE_FEED_PAGE_SIZE'], type=int),
+                app.config['CHANGE_FEED_PAGE_SIZE'])
+    late, changes = changes_since(since, limit)
+    return jsonify({
+        'changes': [serialize(change) for change in late + changes],
+        'next': changes[-1].id if changes else since,
+        'has_more': len(changes) == limit,
+    })
+
+
+@app.route('/admin/api/changes/stream')
+@login_required
+@read_only
+def admin_changes_stream():
+    """Push change feed events to open admin pages over Server-Sent Events
+
+    Each connection holds a sync worker, so admin pages only open it with
+    CHANGE_FEED_TRANSPORT=stream, where asgi.py serves this path instead.
+    """
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('since', type=int)
+    if cursor is None:
+        cursor = latest_cursor()
+    
+    response = Response(stream_with_context(iter_event_stream(cursor)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Keep reverse proxies from buffering events
+    return response
+
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus metrics for logged-in admins or a scraper holding METRICS_TOKEN"""
+    if not current_user.is_authenticated and not has_bearer_token('METRICS_TOKEN'):
+        return app.login_manager.unauthorized()
+    
+    response = make_response(render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4'
+    return response
+
+
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Recently captured request profiles"""
+    return render_template('admin/profiles.html', profiles=list_profiles(),
+                         sample_rate=app.config['PROFILE_SAMPLE_RATE'])
+
+
+@app.route('/admin/profiles/<name>')
+@login_required
+def admin_profile_detail(name):
+    """Show a profile summary or download the raw pstats file"""
+    if secure_filename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        abort(404)
+    
+    if request.args.get('download'):
+        return send_from_directory(profile_dir(), name, as_attachment=True)
+    
+    if not os.path.exists(os.path.join(profile_dir(), name)):
+        abort(404)
+    
+    return render_template('admin/profile_detail.html', name=name, summary=profile_summary(name))
+
+
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    """Serve uploaded files"""
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Serve uploaded files, or redirect to a presigned URL on object storage"""
+    return get_storage().serve(resolve_key(filename))
@@ -0,0 +1,128 @@
+"""Cache-busting and precompressed serving for files under /static.
+
+url_for('static', filename=...) gains a ``v`` content hash, and requests that
+carry it are served with a one-year ``Cache-Control: immutable``. Run
+``flask compress-static`` at deploy time to write .gz/.br variants, which are
+then served directly to clients that accept them.
+"""
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+
+import click
+from flask import request, send_from_directory
+
+from app import app
+from compression import brotli, supported_encodings
+
+
+PRECOMPRESS_EXTENSIONS = {'.css', '.js', '.mjs', '.svg', '.html', '.txt', '.json', '.map', '.xml'}
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+def asset_hash(filename):
+    """Short content hash of a static file, cached until its mtime changes"""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _hash_lock:
+        cached = _hash_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    value = digest.hexdigest()[:12]
+
+    with _hash_lock:
+        _hash_cache[path] = (mtime, value)
+    return value
+
+
+@app.url_defaults
+def add_asset_version(endpoint, values):
+    """Append the content hash to static URLs"""
+    if endpoint != 'static' or 'v' in values or 'filename' not in values:
+        return
+    if values['filename'].startswith('uploads/'):
+        return
+    version = asset_hash(values['filename'])
+    if version:
+        values['v'] = version
+
+
+def _precompressed_variant(filename):
+    """Pick a fresh .br/.gz sibling the client accepts, if one exists"""
+    encoding = request.accept_encodings.best_match(supported_encodings())
+    if encoding is None:
+        return None, None
+    original = os.path.join(app.static_folder, filename)
+    variant = filename + ENCODING_SUFFIXES[encoding]
+    try:
+        if os.stat(os.path.join(app.static_folder, variant)).st_mtime >= os.stat(original).st_mtime:
+            return variant, encoding
+    except OSError:
+        pass
+    return None, None
+
+
+def serve_static(filename):
+    """Static file view with precompressed variants and immutable caching"""
+    versioned = bool(request.args.get('v'))
+    max_age = IMMUTABLE_MAX_AGE if versioned else None
+
+    variant, encoding = _precompressed_variant(filename)
+    if variant:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(app.static_folder, variant, mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+
+    if versioned:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
+
+
+app.view_functions['static'] = serve_static
+
+
+@app.cli.command('compress-static')
+def compress_static():
+    """Write .gz (and .br when available) variants of text assets in /static."""
+    written = 0
+    for root, dirs, files in os.walk(app.static_folder):
+        # Uploaded documents are not build assets
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.join(app.static_folder, 'uploads')]
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            mtime = os.stat(path).st_mtime
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            variants = [('.gz', lambda d: gzip.compress(d, 9, mtime=0))]
+            if brotli is not None:
+                variants.append(('.br', lambda d: brotli.compress(d, quality=11)))
+            for suffix, encode in variants:
+                target = path + suffix
+                if os.path.exists(target) and os.stat(target).st_mtime >= mtime:
+                    continue
+                with open(target, 'wb') as f:
+                    f.write(encode(data))
+                written += 1
+    click.echo(f'Wrote {written} precompressed file(s)')
@@ -0,0 +1,192 @@
+"""Storage backends for uploaded documents.
+
+Documents are addressed by the key stored in the ``*_file`` columns (for
+example ``crew/3f/a9/crew_1a2b3c4d_passport.pdf``). STORAGE_BACKEND selects where
+the bytes live:
+
+* ``local`` (default) keeps files under UPLOAD_FOLDER and serves them from
+  the app, as before.
+* ``s3`` keeps them in an S3-compatible bucket (AWS, MinIO, moto) and hands
+  out presigned URLs, so downloads and direct uploads bypass the app servers.
+  Requires the optional ``boto3`` package (the ``s3`` extra); credentials
+  come from the usual AWS environment variables or instance profile.
+"""
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from flask import current_app, redirect, send_from_directory
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 is optional
+    boto3 = None
+    ClientError = None
+
+
+class LocalStorage:
+    """Documents on the local filesystem under a root directory"""
+
+    supports_presigned_urls = False
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        path = os.path.realpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f'Key escapes the storage root: {key}')
+        return path
+
+    def save(self, key, fileobj):
+        """Write fileobj to key, replacing it atomically"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                for block in iter(lambda: fileobj.read(64 * 1024), b''):
+                    target.write(block)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def stat(self, key):
+        """(size in bytes, modification datetime) of key, or None if missing"""
+        try:
+            stat = os.stat(self.path(key))
+        except OSError:
+            return None
+        return stat.st_size, datetime.fromtimestamp(stat.st_mtime)
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def copy(self, source_key, target_key):
+        """Make target_key a copy of source_key (a hard link where possible)"""
+        source, target = self.path(source_key), self.path(target_key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(source, target)
+        # Links and copy2 keep the source's mtime; the upload collector's grace period
+        # must count from now, or it could delete the copy before it is referenced
+        os.utime(target)
+
+    def serve(self, key):
+        """Response delivering key to the browser"""
+        return send_from_directory(self.root, key)
+
+
+class S3Storage:
+    """Documents in an S3-compatible bucket, served through presigned URLs"""
+
+    supports_presigned_urls = True
+
+    def __init__(self, bucket, prefix='', client=None, endpoint_url=None, region=None, expires_in=900,
+                 storage_class=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError('STORAGE_BACKEND=s3 requires the boto3 package')
+            client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.expires_in = expires_in
+        self.storage_class = storage_class
+
+    def object_key(self, key):
+        if key.startswith('/') or '..' in key.split('/'):
+            raise ValueError(f'Invalid storage key: {key}')
+        return self.prefix + key
+
+    def save(self, key, fileobj):
+        extra_args = {'StorageClass': self.storage_class} if self.storage_class else None
+        self.client.upload_fileobj(fileobj, self.bucket, self.object_key(key), ExtraArgs=extra_args)
+
+    def open(self, key):
+        """Streaming body of the object; supports read(size) and close()"""
+        return self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))['Body']
+
+    def stat(self, key):
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        modified = head['LastModified'].astimezone(timezone.utc).replace(tzinfo=None)
+        return head['ContentLength'], modified
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def copy(self, source_key, target_key):
+        self.client.copy_object(Bucket=self.bucket, Key=self.object_key(target_key),
+                                CopySource={'Bucket': self.bucket, 'Key': self.object_key(source_key)})
+
+    def download_url(self, key):
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': self.object_key(key)},
+            ExpiresIn=self.expires_in)
+
+    def presigned_upload(self, key, max_size):
+        """URL and form fields for a browser POST straight to the bucket"""
+        return self.client.generate_presigned_post(
+            self.bucket, self.object_key(key),
+            Conditions=[['content-length-range', 1, max_size]],
+            ExpiresIn=self.expires_in)
+
+    def serve(self, key):
+        return redirect(self.download_url(key))
+
+
+def create_storage(config):
+    """Build the backend selected by STORAGE_BACKEND"""
+    backend = config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(os.path.join(current_app.root_path, config['UPLOAD_FOLDER']))
+    if backend == 's3':
+        return S3Storage(config['S3_BUCKET'], prefix=config['S3_PREFIX'], endpoint_url=config['S3_ENDPOINT_URL'],
+                         region=config['S3_REGION'], expires_in=config['S3_PRESIGN_TTL'])
+    raise RuntimeError(f'Unknown STORAGE_BACKEND: {backend}')
+
+
+def create_archive_storage(config):
+    """Cold storage for documents of archived records (ARCHIVE_STORAGE_BACKEND)"""
+    backend = config['ARCHIVE_STORAGE_BACKEND'] or config['STORAGE_BACKEND']
+    if backend == 'local':
+        return LocalStorage(os.path.join(current_app.root_path, config['ARCHIVE_UPLOAD_FOLDER']))
+    if backend == 's3':
+        return S3Storage(config['ARCHIVE_S3_BUCKET'] or config['S3_BUCKET'], prefix=config['ARCHIVE_S3_PREFIX'],
+                         endpoint_url=config['S3_ENDPOINT_URL'], region=config['S3_REGION'],
+                         expires_in=config['S3_PRESIGN_TTL'], storage_class=config['ARCHIVE_S3_STORAGE_CLASS'])
+    raise RuntimeError(f'Unknown ARCHIVE_STORAGE_BACKEND: {backend}')
+
+
+def get_storage():
+    """The app's storage backend, created on first use"""
+    extensions = current_app.extensions
+    if 'storage' not in extensions:
+        extensions['storage'] = create_storage(current_app.config)
+    return extensions['storage']
+
+
+def get_archive_storage():
+    """Cold storage backend for archived documents, created on first use"""
+    extensions = current_app.extensions
+    if 'archive_storage' not in extensions:
+        extensions['archive_storage'] = create_archive_storage(current_app.config)
+    return extensions['archive_storage']
@@ -0,0 +1,76 @@
+"""Concurrent, all-or-nothing saving of several uploaded documents.
+
+A form can carry up to 14 documents. UploadBatch writes them in a shared,
+bounded thread pool instead of one after another. Every file goes to a fresh
+unique key that no row references yet, so the files stay invisible until the
+caller commits the ``*_file`` columns in one transaction. If any save, or the
+commit, fails, every file the batch wrote is deleted again. A crash between
+the two steps leaves only unreferenced files, which ``flask gc-uploads``
+collects.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from flask import current_app
+
+from storage import get_storage
+from utils import save_uploaded_file
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload-save')
+        return _pool
+
+
+class UploadBatch:
+    """Documents saved together; removed again if the block raises
+
+    Usage::
+
+        with UploadBatch('crew') as batch:
+            for field, key in batch.save(files).items():
+                setattr(crew_member, field, key)
+            db.session.commit()
+    """
+
+    def __init__(self, folder_type):
+        self.folder_type = folder_type
+        self.written = []  # Every key stored, including kept originals
+
+    def save(self, files):
+        """Save {field: FileStorage} concurrently; returns {field: key}"""
+        app = current_app._get_current_object()
+
+        def save_one(file):
+            with app.app_context():
+                return save_uploaded_file(file, self.folder_type, written=self.written)
+
+        pool = _get_pool(app.config['UPLOAD_SAVE_WORKERS'])
+        futures = {field: pool.submit(save_one, file) for field, file in files.items()}
+        wait(futures.values())  # Let every save finish before deciding
+        return {field: future.result() for field, future in futures.items()}
+
+    def discard(self):
+        """Delete every file this batch wrote"""
+        storage = get_storage()
+        for key in self.written:
+            try:
+                storage.delete(key)
+            except Exception:
+                current_app.logger.exception('Could not remove %s after a failed upload', key)
+        self.written = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.discard()
+        return False
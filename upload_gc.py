@@ -0,0 +1,221 @@
+"""Garbage collection of uploaded files that no row references.
+
+Re-uploads overwrite a ``*_file`` column and leave the old file behind, and a
+registration that fails after save_uploaded_file() leaves files nobody
+points at. ``flask gc-uploads`` streams the referenced keys from the
+database, walks the upload folder with os.scandir and deletes (or moves to
+UPLOAD_QUARANTINE_FOLDER) unreferenced files older than the grace period.
+
+Directories are visited in sorted order and the last finished directory is
+checkpointed, so an interrupted run over millions of files resumes where it
+stopped. Kept originals (``<folder>/originals/``) live as long as the
+normalized copy they belong to.
+"""
+import os
+import json
+import shutil
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+
+from app import app, db
+from models import CrewMember, StaffMember
+from storage import LocalStorage, get_storage
+
+
+STATE_FILENAME = 'upload_gc_state.json'
+
+
+def iter_referenced_keys(batch_size=5000):
+    """Yield every document key stored in a crew or staff *_file column"""
+    for model in (CrewMember, StaffMember):
+        columns = [column for column in model.__table__.columns if column.key.endswith('_file')]
+        for row in db.session.query(*columns).yield_per(batch_size):
+            for key in row:
+                if key:
+                    yield key
+
+
+def owning_key(key):
+    """Key whose reference keeps this file alive
+
+    An original kept beside a normalized image belongs to the JPEG copy.
+    """
+    folder, _, name = key.rpartition('/')
+    parent, _, leaf = folder.rpartition('/')
+    if leaf == 'originals':
+        stem = os.path.splitext(name)[0]
+        return f'{parent}/{stem}.jpg' if parent else f'{stem}.jpg'
+    return key
+
+
+class Throttle:
+    """Sleep so that at most rate operations run per second (0 = unlimited)"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+class Checkpoint:
+    """Last fully processed directory, persisted as JSON"""
+
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.position = None  # Nothing processed yet
+        self.totals = {}
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.position = tuple(state['position'])
+        self.totals = state.get('totals', {})
+        return True
+
+    def save(self, position, totals):
+        self.position = position
+        if not self.enabled:
+            return
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'position': list(position), 'totals': totals,
+                       'saved_at': datetime.utcnow().isoformat()}, f)
+        os.replace(temp_path, self.path)
+
+    def clear(self):
+        if self.enabled:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class UploadCollector:
+    """One garbage collection pass over a local upload folder"""
+
+    def __init__(self, root, referenced, grace, quarantine=None, dry_run=False, rate=0,
+                 checkpoint=None, report=None):
+        self.root = root
+        self.referenced = referenced
+        self.cutoff = time.time() - grace.total_seconds()
+        self.quarantine = quarantine
+        self.dry_run = dry_run
+        self.throttle = Throttle(rate)
+        self.checkpoint = checkpoint or Checkpoint(None, enabled=False)
+        self.report = report
+        self.totals = {'scanned': 0, 'referenced': 0, 'recent': 0, 'collected': 0, 'bytes': 0}
+        for name, value in self.checkpoint.totals.items():
+            self.totals[name] = value
+
+    def run(self):
+        self._walk(self.root, ())
+        return self.totals
+
+    def _walk(self, path, position):
+        resume_from = self.checkpoint.position
+        # Directories sort in visiting order; skip subtrees finished before the checkpoint
+        if resume_from is not None and position < resume_from and resume_from[:len(position)] != position:
+            return
+        pending = resume_from is None or position > resume_from
+
+        subdirectories = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.name)
+                elif pending and entry.is_file(follow_symlinks=False):
+                    self._visit(entry, position)
+
+        if pending:
+            self.checkpoint.save(position, self.totals)
+        for name in sorted(subdirectories):
+            self._walk(os.path.join(path, name), position + (name,))
+
+    def _visit(self, entry, position):
+        self.totals['scanned'] += 1
+        key = '/'.join(position + (entry.name,))
+        if owning_key(key) in self.referenced:
+            self.totals['referenced'] += 1
+            return
+
+        self.throttle.wait()
+        stat = entry.stat(follow_symlinks=False)
+        if stat.st_mtime > self.cutoff:
+            self.totals['recent'] += 1
+            return
+
+        self.totals['collected'] += 1
+        self.totals['bytes'] += stat.st_size
+        action = 'would-remove' if self.dry_run else ('quarantine' if self.quarantine else 'delete')
+        if self.report:
+            self.report(action, key, stat)
+        if self.dry_run:
+            return
+        if self.quarantine:
+            target = os.path.join(self.quarantine, *position, entry.name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(entry.path, target)
+        else:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed.')
+@click.option('--quarantine', 'quarantine', is_flag=True,
+              help='Move files to UPLOAD_QUARANTINE_FOLDER instead of deleting them.')
+@click.option('--grace-hours', type=float, default=None,
+              help='Keep unreferenced files younger than this (default UPLOAD_GC_GRACE_HOURS).')
+@click.option('--max-ops', type=float, default=0, help='Limit file operations per second (0 = unlimited).')
+@click.option('--restart', is_flag=True, help='Ignore a saved checkpoint and start from the beginning.')
+@click.option('--verbose', '-v', is_flag=True, help='List every file that is removed.')
+def gc_uploads(dry_run, quarantine, grace_hours, max_ops, restart, verbose):
+    """Delete or quarantine uploaded files that no crew or staff row references."""
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        raise click.ClickException('gc-uploads walks the local upload folder; '
+                                   'use bucket lifecycle rules for object storage')
+    if grace_hours is None:
+        grace_hours = current_app.config['UPLOAD_GC_GRACE_HOURS']
+
+    checkpoint = Checkpoint(os.path.join(current_app.instance_path, STATE_FILENAME), enabled=not dry_run)
+    if not restart and not dry_run and checkpoint.load():
+        click.echo(f"Resuming after {'/'.join(checkpoint.position) or '(top level)'}", err=True)
+
+    referenced = set(iter_referenced_keys())
+    db.session.rollback()  # Release the read transaction before the long walk
+    click.echo(f'{len(referenced)} referenced file(s)', err=True)
+
+    def report(action, key, stat):
+        if verbose or dry_run:
+            modified = datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')
+            click.echo(f'{action}\t{key}\t{stat.st_size}\t{modified}')
+
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    collector = UploadCollector(
+        storage.root, referenced, timedelta(hours=grace_hours),
+        quarantine=current_app.config['UPLOAD_QUARANTINE_FOLDER'] if quarantine else None,
+        dry_run=dry_run, rate=max_ops, checkpoint=checkpoint, report=report)
+    totals = collector.run()
+    checkpoint.clear()
+
+    verb = 'Would remove' if dry_run else ('Quarantined' if quarantine else 'Deleted')
+    click.echo(f"Scanned {totals['scanned']} file(s): {totals['referenced']} referenced, "
+               f"{totals['recent']} within the grace period. {verb} {totals['collected']} "
+               f"({totals['bytes'] / (1024 * 1024):.1f} MB).", err=True)
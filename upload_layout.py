@@ -0,0 +1,158 @@
+"""Two-level hash fan-out layout for uploaded documents.
+
+New uploads are stored as ``crew/ab/cd/<name>`` (see utils.upload_dir) so no
+directory grows past a few thousand entries. Older rows still hold flat
+``crew/<name>`` keys; ``flask migrate-upload-layout`` moves those files in
+batches while the app keeps serving. Each batch copies (hard-links, on local
+storage) every file to its new key, rewrites the ``*_file`` columns in one
+transaction, and only then deletes the old files. Until a row is migrated,
+uploaded_file() finds a moved file under either key.
+"""
+import os
+import re
+
+import click
+from sqlalchemy import and_, not_, or_, update
+
+from app import app, db
+from image_processing import IMAGE_EXTENSIONS
+from models import CrewMember, StaffMember
+from storage import get_storage
+from upload_gc import Throttle
+from utils import upload_dir
+
+
+LEGACY_KEY = re.compile(r'^(crew|staff)/([^/]+)$')
+
+# model -> folder its uploads are stored under
+UPLOAD_MODELS = {CrewMember: 'crew', StaffMember: 'staff'}
+
+
+def fanout_key(key):
+    """Fan-out location of a flat legacy key, or None if key is not one"""
+    match = LEGACY_KEY.match(key or '')
+    if not match:
+        return None
+    folder, name = match.groups()
+    return f'{upload_dir(folder, os.path.splitext(name)[0])}/{name}'
+
+
+def resolve_key(key):
+    """Key a document can be read from right now
+
+    A flat key whose file has already been moved resolves to its fan-out
+    location. Fan-out keys are returned unchanged without touching storage.
+    """
+    moved = fanout_key(key)
+    if moved is None:
+        return key
+    storage = get_storage()
+    if storage.stat(key) is None and storage.stat(moved) is not None:
+        return moved
+    return key
+
+
+def _file_columns(model):
+    return [column for column in model.__table__.columns if column.key.endswith('_file')]
+
+
+def _legacy_condition(model):
+    folder = UPLOAD_MODELS[model]
+    return or_(*[and_(column.like(f'{folder}/%'), not_(column.like(f'{folder}/%/%')))
+                 for column in _file_columns(model)])
+
+
+def _kept_originals(storage, key, target_key):
+    """(old, new) keys of originals kept beside a normalized image"""
+    folder, name = key.rsplit('/', 1)
+    stem = os.path.splitext(name)[0]
+    target_folder = target_key.rsplit('/', 1)[0]
+    for ext in sorted(IMAGE_EXTENSIONS):
+        original = f'{folder}/originals/{stem}{ext}'
+        if storage.stat(original) is not None:
+            yield original, f'{target_folder}/originals/{stem}{ext}'
+
+
+def migrate_batch(model, rows, throttle, dry_run=False):
+    """Move the legacy files of rows and rewrite their keys; returns (files, missing)"""
+    storage = get_storage()
+    table = model.__table__
+    moved_files = missing = 0
+    plans = []
+
+    for row in rows:
+        changes, copies = {}, []
+        for column in _file_columns(model):
+            key = getattr(row, column.key)
+            target = fanout_key(key)
+            if target is None:
+                continue
+            throttle.wait()
+            if storage.stat(key) is None:
+                missing += 1  # Broken reference; leave it for an operator to look at
+                continue
+            changes[column.key] = (key, target)
+            copies.append((key, target))
+            copies.extend(_kept_originals(storage, key, target))
+        if changes:
+            plans.append((row.id, changes, copies))
+            moved_files += len(copies)
+
+    if dry_run:
+        return moved_files, missing
+
+    for _, _, copies in plans:
+        for source, target in copies:
+            throttle.wait()
+            storage.copy(source, target)
+
+    # Only rewrite rows whose keys are still the ones we copied
+    applied = []
+    for row_id, changes, copies in plans:
+        unchanged = [table.c[name] == old for name, (old, _) in changes.items()]
+        values = {name: new for name, (_, new) in changes.items()}
+        result = db.session.execute(
+            update(table).where(table.c.id == row_id, *unchanged)
+            .values(updated_at=table.c.updated_at, **values))
+        applied.append((result.rowcount == 1, copies))
+    db.session.commit()
+
+    for updated, copies in applied:
+        for source, target in copies:
+            throttle.wait()
+            storage.delete(source if updated else target)
+    return moved_files, missing
+
+
+def migrate_layout(batch_size=200, max_ops=0, dry_run=False, echo=None):
+    """Move every flat legacy upload to the fan-out layout; returns totals"""
+    throttle = Throttle(max_ops)
+    totals = {'rows': 0, 'files': 0, 'missing': 0}
+    for model in UPLOAD_MODELS:
+        last_id = 0
+        while True:
+            rows = (model.query.filter(model.id > last_id, _legacy_condition(model))
+                    .order_by(model.id).limit(batch_size).all())
+            if not rows:
+                break
+            last_id = rows[-1].id
+            files, missing = migrate_batch(model, rows, throttle, dry_run=dry_run)
+            db.session.rollback()
+            totals['rows'] += len(rows)
+            totals['files'] += files
+            totals['missing'] += missing
+            if echo:
+                echo(f"{model.__tablename__}: through id {last_id}, {totals['files']} file(s)")
+    return totals
+
+
+@app.cli.command('migrate-upload-layout')
+@click.option('--batch-size', default=200, show_default=True, help='Rows per transaction.')
+@click.option('--max-ops', type=float, default=0, help='Limit storage operations per second (0 = unlimited).')
+@click.option('--dry-run', is_flag=True, help='Count the files that would move without changing anything.')
+def migrate_upload_layout(batch_size, max_ops, dry_run):
+    """Move flat crew/ and staff/ uploads into the hash fan-out layout."""
+    totals = migrate_layout(batch_size, max_ops, dry_run, echo=lambda line: click.echo(line, err=True))
+    verb = 'Would move' if dry_run else 'Moved'
+    click.echo(f"{verb} {totals['files']} file(s) for {totals['rows']} row(s); "
+               f"{totals['missing']} referenced file(s) were missing.")
@@ -1,26 +1,66 @@
 import os
+import csv
 import uuid
+import hashlib
+from io import StringIO, BytesIO
 from werkzeug.utils import secure_filename
 from flask import current_app
 
+from image_processing import should_normalize, normalize_image
+from storage import get_storage
 
-def save_uploaded_file(file, folder_type):
-    """Save uploaded file and return filename"""
+
+def unique_upload_name(filename, folder_type):
+    """Collision-free (name prefix, extension) for an uploaded filename"""
+    name, ext = os.path.splitext(secure_filename(filename))
+    return f"{folder_type}_{uuid.uuid4().hex[:8]}_{name}", ext
+
+
+def upload_dir(folder_type, unique_prefix):
+    """Two-level hash fan-out directory for an upload, e.g. crew/ab/cd
+
+    The hash covers the name without its extension, so a normalized JPEG and
+    its kept original land in the same directory.
+    """
+    digest = hashlib.sha1(unique_prefix.encode('utf-8')).hexdigest()
+    return f"{folder_type}/{digest[:2]}/{digest[2:4]}"
+
+
+def save_uploaded_file(file, folder_type, written=None):
+    """Save uploaded file and return filename
+
+    Every key stored (including a kept original) is appended to written.
+    """
+    if written is None:
+        written = []
     if file and file.filename:
-        # Generate unique filename
-        filename = secure_filename(file.filename)
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{folder_type}_{uuid.uuid4().hex[:8]}_{name}{ext}"
+        unique_prefix, ext = unique_upload_name(file.filename, folder_type)
+        directory = upload_dir(folder_type, unique_prefix)
+        storage = get_storage()
         
-        # Create upload directory if it doesn't exist
-        upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], folder_type)
-        os.makedirs(upload_path, exist_ok=True)
+        # Normalize photos and scans before storing them
+        if should_normalize(ext):
+            original = file.read()
+            normalized = normalize_image(original)
+            if normalized is not None:
+                if current_app.config['IMAGE_KEEP_ORIGINAL']:
+                    original_key = f"{directory}/originals/{unique_prefix}{ext}"
+                    storage.save(original_key, BytesIO(original))
+                    written.append(original_key)
+                
+                # Originals keep their name under originals/; the stored copy is always JPEG
+                key = f"{directory}/{unique_prefix}.jpg"
+                storage.save(key, BytesIO(normalized))
+                written.append(key)
+                return key
+            file.stream.seek(0)
         
         # Save file
-        file_path = os.path.join(upload_path, unique_filename)
-        file.save(file_path)
+        key = f"{directory}/{unique_prefix}{ext}"
+        storage.save(key, file.stream)
+        written.append(key)
         
-        return f"{folder_type}/{unique_filename}"
+        return key
     
     return None
 
@@ -29,3 +69,19 @@ def allowed_file(filename, allowed_extensions):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in allowed_extensions
+
+
+def iter_csv(header, rows, batch_size=500):
+    """Yield CSV text in chunks of batch_size rows"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(header)
+    
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % batch_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    
+    yield output.getvalue()
@@ -0,0 +1,85 @@
+import os
+import zipfile
+
+from flask import current_app
+
+from storage import get_storage
+from upload_layout import resolve_key
+
+
+CHUNK_SIZE = 64 * 1024
+
+# Formats that are already compressed gain nothing from deflate
+STORED_EXTENSIONS = {'.pdf', '.jpg', '.jpeg', '.png', '.docx', '.zip'}
+
+
+class _ChunkBuffer:
+    """Write-only sink that hands written bytes back to the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries):
+    """Yield a ZIP archive built on the fly from (arcname, storage key) pairs
+
+    Files are read in fixed-size chunks and nothing is written to disk, so
+    memory use stays constant regardless of archive size. Missing files are
+    skipped.
+    """
+    for chunk in _iter_zip(entries):
+        if chunk:
+            yield chunk
+
+
+def _iter_zip(entries):
+    storage = get_storage()
+    sink = _ChunkBuffer()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for arcname, key in entries:
+            stat = storage.stat(key)
+            if stat is None:
+                current_app.logger.warning('Skipping missing document %s', key)
+                continue
+            
+            size, modified = stat
+            info = zipfile.ZipInfo(arcname, modified.timetuple()[:6])
+            info.file_size = size
+            if os.path.splitext(key)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            
+            source = storage.open(key)
+            try:
+                with archive.open(info, 'w') as target:
+                    for block in iter(lambda: source.read(CHUNK_SIZE), b''):
+                        target.write(block)
+                        yield sink.drain()
+            finally:
+                source.close()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def crew_document_entries(crew_member, folder=''):
+    """(arcname, storage key) pairs for every uploaded document of a crew member"""
+    for doc in crew_member.get_required_documents():
+        stored = getattr(crew_member, doc['field'])
+        if not stored:
+            continue
+        ext = os.path.splitext(stored)[1]
+        name = doc['name'].replace('/', '-')
+        yield f'{folder}{name}{ext}', resolve_key(stored)